@@ -0,0 +1,97 @@
+"""
+Cleaning, serializing and packaging a chapter's content: the old separate passes
+(empty <p>, styles, indent) vs. the single cleanup walk, with and without pretty
+printing. Packaging is the chapter document as written into the EPUB, which
+EpubHtml builds by parsing the content again, and CompactHtml around the bytes.
+
+    python -m benchmarks.bench_cleanup [saved_chapter.html ...]
+"""
+import sys
+import time
+
+from lxml import etree
+
+from benchmarks.pages import load_pages
+from ebooklib import epub
+from parser2 import cleanup, styles
+from parser2.book import CompactHtml
+from parser2.document import parse_html
+
+CONTENT_XPATH = '//*[@class="content-text"]'
+
+BOOK = epub.EpubBook()
+BOOK.set_language("ru")
+
+
+def clean_styles(root):
+    """
+    Clean the style attribute of every element under root, removing it once it is empty.
+    """
+    for el in root.iter():
+        style = el.get("style")
+        if style is None:
+            continue
+
+        style = styles.clean_style(style)
+        if style:
+            el.set("style", style)
+        else:
+            del el.attrib["style"]
+
+
+def serialize(content, pretty_print: bool) -> bytes:
+    if pretty_print:
+        etree.indent(content, space="\t")
+    return etree.tostring(content, encoding="UTF-8", pretty_print=pretty_print)
+
+
+def package(content: bytes, html=epub.EpubHtml) -> bytes:
+    item = html(title="Глава", file_name="Text/chapter-0.xhtml", content=content)
+    item.book = BOOK
+    return item.get_content()
+
+
+def separate(content) -> bytes:
+    for p in content.xpath(".//p"):
+        if len(p) == 0 and not p.text:
+            p.getparent().remove(p)
+    clean_styles(content)
+    return package(serialize(content, True))
+
+
+def single(content) -> bytes:
+    cleanup.clean_content(content)
+    return package(serialize(content, True))
+
+
+def compact(content) -> bytes:
+    cleanup.clean_content(content)
+    return package(serialize(content, False), CompactHtml)
+
+
+def bench(pages: list[bytes], method, rounds: int = 200) -> float:
+    # best of the rounds, single runs are short enough for noise to dominate
+    best = None
+    for _ in range(rounds):
+        elapsed = 0.0
+        for page in pages:
+            # a fresh tree each time, cleaning changes it
+            content = parse_html(page, "utf-8").xpath(CONTENT_XPATH)[0]
+            start = time.perf_counter()
+            method(content)
+            elapsed += time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(pages)
+
+
+def main():
+    pages = load_pages(sys.argv[1:])
+
+    methods = (("separate passes", separate), ("single walk", single), ("compact", compact))
+    for name, method in methods:
+        print(f"{name:<16} {bench(pages, method) * 1000:8.3f} ms/chapter")
+
+
+if __name__ == "__main__":
+    main()
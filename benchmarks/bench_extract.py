@@ -0,0 +1,102 @@
+"""
+Getting the content-text div out of a chapter page fed in download-sized chunks:
+a full tree of the page, the same built while feeding, or only the div's bytes parsed.
+
+    python -m benchmarks.bench_extract [saved_chapter.html ...]
+"""
+import sys
+import time
+import tracemalloc
+
+from lxml import etree
+
+from benchmarks.pages import load_pages
+from parser2.document import ContentFeed, parse_html
+
+CHUNK = 16 * 1024
+CONTENT_XPATH = '//*[@class="content-text"]'
+
+
+class DocumentFeed:
+    """
+    Download sink that parses a page with lxml's feed interface while it arrives,
+    so parsing overlaps the transfer and the raw page is never held whole.
+    """
+
+    def __init__(self):
+        self.parser = None
+
+    def reset(self, encoding: str = None):
+        # a parser that is being fed can not be shared, one per document
+        self.parser = etree.HTMLParser(encoding=encoding)
+
+    def write(self, chunk: bytes) -> bool:
+        self.parser.feed(chunk)
+        return True
+
+    def close(self):
+        """
+        Finish parsing, returning the root of the page.
+        """
+        return self.parser.close()
+
+
+def full(page: bytes):
+    return parse_html(page, "utf-8")
+
+
+def fed(page: bytes, feed):
+    feed.reset("utf-8")
+    for i in range(0, len(page), CHUNK):
+        feed.write(page[i : i + CHUNK])
+    return feed.close()
+
+
+METHODS = {
+    "full tree": full,
+    "document feed": lambda page: fed(page, DocumentFeed()),
+    "content feed": lambda page: fed(page, ContentFeed()),
+}
+
+
+def extract(method, page: bytes):
+    root = method(page)
+    return root, root.xpath(CONTENT_XPATH)[0]
+
+
+def bench(pages: list[bytes], method, rounds: int = 20):
+    extract(method, pages[0])  # warm up
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            extract(method, page)
+    elapsed = (time.perf_counter() - start) / (rounds * len(pages))
+
+    # tracemalloc only sees Python-level allocations, libxml2 nodes are not counted
+    tracemalloc.start()
+    for page in pages:
+        extract(method, page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # elements built stand in for the libxml2 allocations
+    elements = sum(sum(1 for _ in extract(method, page)[0].iter()) for page in pages)
+    return elapsed, peak, elements / len(pages)
+
+
+def main():
+    pages = load_pages(sys.argv[1:])
+    size = sum(len(page) for page in pages) / len(pages)
+    print(f"pages: {len(pages)}, average size: {size / 1024:.1f} KiB, chunk: {CHUNK // 1024} KiB")
+
+    for name, method in METHODS.items():
+        elapsed, peak, elements = bench(pages, method)
+        print(
+            f"{name:<14} {elapsed * 1000:8.2f} ms/page    elements: {elements:7.0f}"
+            f"    peak python memory: {peak / 1024:8.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
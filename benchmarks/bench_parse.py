@@ -0,0 +1,47 @@
+"""
+Parse time and peak memory of the BeautifulSoup round-trip vs. direct lxml parsing.
+
+    python -m benchmarks.bench_parse [saved_chapter.html ...]
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.pages import load_pages
+from parser2.document import ParseMode, parse_html
+
+
+def bench(pages: list[bytes], mode: ParseMode, rounds: int = 20):
+    parse_html(pages[0], "utf-8", mode)  # warm up
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            parse_html(page, "utf-8", mode)
+    elapsed = (time.perf_counter() - start) / (rounds * len(pages))
+
+    # tracemalloc only sees Python-level allocations, libxml2 nodes are not counted
+    tracemalloc.start()
+    for page in pages:
+        parse_html(page, "utf-8", mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    pages = load_pages(sys.argv[1:])
+    size = sum(len(page) for page in pages) / len(pages)
+    print(f"pages: {len(pages)}, average size: {size / 1024:.1f} KiB")
+
+    for mode in (ParseMode.SOUP, ParseMode.LXML):
+        elapsed, peak = bench(pages, mode)
+        print(
+            f"{mode.name:<5} {elapsed * 1000:8.2f} ms/page"
+            f"    peak python memory: {peak / 1024:8.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Chapters per second through the CPU stage (parse, clean, serialize), in process
+and in a process pool of growing size. Scaling stops at the number of cores.
+
+    python -m benchmarks.bench_render [chapters] [saved_chapter.html ...]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.pages import load_pages
+from parser2.document import ContentFeed
+from parser2.render import render_xhtml
+
+
+def content_of(page: bytes) -> bytes:
+    # what the network stage hands over: the content-text div cut out of the page
+    feed = ContentFeed()
+    feed.reset("utf-8")
+    feed.write(page)
+    return feed.content()
+
+
+def in_process(contents: list[bytes]) -> float:
+    start = time.perf_counter()
+    for content in contents:
+        render_xhtml(content, "utf-8", "Глава")
+    return time.perf_counter() - start
+
+
+def pooled(contents: list[bytes], workers: int) -> float:
+    with ProcessPoolExecutor(workers) as pool:
+        # start the workers before timing
+        warm_up = contents[:workers]
+        list(pool.map(render_xhtml, warm_up, ["utf-8"] * workers, ["x"] * workers))
+
+        start = time.perf_counter()
+        for _ in pool.map(
+            render_xhtml, contents, ["utf-8"] * len(contents), ["Глава"] * len(contents)
+        ):
+            pass
+        return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    pages = load_pages(sys.argv[2:])
+    contents = [content_of(pages[i % len(pages)]) for i in range(count)]
+    cores = os.cpu_count()
+    print(f"chapters: {count}, cores: {cores}")
+
+    elapsed = in_process(contents)
+    print(f"in process    {count / elapsed:8.0f} chapters/s")
+
+    workers = 1
+    while workers <= max(cores, 2):
+        elapsed = pooled(contents, workers)
+        print(f"{workers:>2} workers    {count / elapsed:8.0f} chapters/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Cost of telling the format of a response from its first bytes, per kind of body.
+Misses walk the whole signature table, so they are the worst case.
+
+    python -m benchmarks.bench_sniff
+"""
+import time
+
+from parser2.mimetype import SNIFF_SIZE, get_file_extension
+
+SAMPLES = {
+    "jpeg": b"\xFF\xD8\xFF\xE0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00",
+    "png": b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x06@\x00\x00\x04\xb0",
+    "webp": b"RIFF\x24\x10\x00\x00WEBPVP8 \x18\x10\x00\x00",
+    "gif": b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00",
+    "avif": b"\x00\x00\x00\x20ftypavif\x00\x00\x00\x00avifmif1miaf",
+    "jxl": b"\x00\x00\x00\x0cJXL \r\n\x87\n\x00\x00\x00\x14ftypjxl ",
+    "bmp": b"BM\x36\x00\x0c\x00\x00\x00\x00\x00\x36\x00\x00\x00\x28\x00\x00\x00",
+    "svg": b'<?xml version="1.0" encoding="UTF-8"?><svg xmlns="http://www.w3.org/2000/svg">',
+    "html (miss)": b"<!DOCTYPE html>\n<html><head><title>404 Not Found</title>",
+    "rss (miss)": b'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>',
+    "mp4 (miss)": b"\x00\x00\x00\x20ftypisom\x00\x00\x02\x00isomiso2avc1mp41",
+}
+
+
+def bench(head: bytes, rounds: int = 200_000) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        get_file_extension(head)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    for name, sample in SAMPLES.items():
+        head = sample[:SNIFF_SIZE]
+        ext, _ = get_file_extension(head)
+        elapsed = bench(head)
+        print(f"{name:<12} {str(ext):<6} {elapsed * 1e9:8.0f} ns/sniff")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Reading the chapter list of a book index: the old way over a full tree (absolute
+paths, xpath strings and re.sub per row) vs. TocFeed fed in download-sized chunks.
+
+    python -m benchmarks.bench_toc [rows]
+"""
+import re
+import sys
+import time
+
+from benchmarks.pages import toc_page
+from parser2 import toc
+from parser2.document import parse_html
+
+CHUNK = 16 * 1024
+ROWS_XPATH = "/html/body/div[2]/div[3]/div[1]/form/table/tbody/tr"
+
+
+def old(page: bytes) -> list:
+    records = []
+    volumes = 0
+    for row in parse_html(page, "utf-8").xpath(ROWS_XPATH):
+        if row.get("id"):
+            if row.get("id")[0:3] == "vol":
+                row.xpath("td/strong")[0].text
+                volumes += 1
+            elif row.get("id")[0:1] == "c":
+                a = row.xpath("td/a")
+                if len(a) > 1:
+                    ctitle = a[0].text
+                    ctitle = re.sub(R"[\s]*(.*)", R"\1", ctitle)
+                    ctitle = re.sub(R"[\s]{2,}", R" ", ctitle)
+                    cid = row.get("id").split("_")[1]
+                    records.append((volumes, cid, a[0].get("href"), ctitle))
+    return records
+
+
+def feed(page: bytes) -> list:
+    records = []
+    sink = toc.TocFeed(lambda root: None, lambda volume: None, records.append)
+    sink.reset("utf-8")
+    for i in range(0, len(page), CHUNK):
+        sink.write(page[i : i + CHUNK])
+    sink.close()
+    return records
+
+
+def bench(page: bytes, method, rounds: int = 5):
+    records = method(page)  # warm up
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        method(page)
+    return (time.perf_counter() - start) / rounds, len(records)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    page = toc_page(rows)
+    print(f"rows: {rows}, page size: {len(page) / 1024:.1f} KiB, chunk: {CHUNK // 1024} KiB")
+
+    for name, method in (("absolute paths", old), ("toc feed", feed)):
+        elapsed, records = bench(page, method)
+        print(
+            f"{name:<15} {elapsed * 1000:8.1f} ms    {records} chapters"
+            f"    {elapsed / records * 1e6:6.2f} us/row"
+        )
+
+
+if __name__ == "__main__":
+    main()
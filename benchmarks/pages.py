@@ -0,0 +1,70 @@
+"""
+Synthetic tl.rulate.ru pages for the benchmarks, used when no saved pages are given.
+"""
+
+CHAPTER_PARAGRAPH = (
+    '<p style="margin-left: 0cm; margin-right: 0cm; text-indent: 35.4pt; '
+    "line-height: 150%; font-size: 12pt; font-family: 'Times New Roman', serif; "
+    'color: #000000;">Тестовый абзац главы номер {i}, немного текста для объёма.</p>\n'
+)
+
+COMMENT = (
+    '<div class="comment"><div class="author"><a href="/users/{i}">user{i}</a></div>'
+    '<div class="text"><p>Спасибо за перевод! Комментарий {i}.</p></div></div>\n'
+)
+
+
+def chapter_page(paragraphs: int = 200, comments: int = 300) -> bytes:
+    body = "".join(CHAPTER_PARAGRAPH.format(i=i) for i in range(paragraphs))
+    tail = "".join(COMMENT.format(i=i) for i in range(comments))
+    page = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Глава</title>'
+        '<script>var x = "<div class=content-text>";</script></head><body>'
+        '<div class="navbar"><ul><li><a href="/">Главная</a></li></ul></div>'
+        '<div class="container"><div class="row"><div class="span12">'
+        f'<div class="content-text">\n{body}</div>'
+        f'<div id="comments">{tail}</div>'
+        "</div></div></div></body></html>"
+    )
+    return page.encode("utf-8")
+
+
+def toc_page(rows: int = 20000, volume_every: int = 100) -> bytes:
+    trs = []
+    vol = 0
+    for i in range(rows):
+        if i % volume_every == 0:
+            vol += 1
+            trs.append(
+                f'<tr id="vol_{vol}" class="volume_helper"><td colspan="5">'
+                f"<strong>Том {vol}</strong></td></tr>"
+            )
+        trs.append(
+            f'<tr id="c_{100000 + i}" class="chapter_row"><td class="t">'
+            f'<a href="/book/1/{100000 + i}">   Глава {i}.   Название  главы   </a></td>'
+            f'<td><span class="ago">1 день</span></td>'
+            f'<td><a href="/book/1/{100000 + i}/ready_new" class="btn">читать</a></td></tr>'
+        )
+    page = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>'
+        '<div class="navbar">nav</div>'
+        '<div class="container"><div class="b"></div><div class="c"></div>'
+        "<div><div><h1>Original / Тестовая книга</h1>"
+        '<div><div></div><div></div><div class="description">Описание <b>книги</b></div></div>'
+        '<div class="slick"><div><img src="/i/cover.jpg"></div></div>'
+        '<form><table id="Chapters" class="table"><tbody>'
+        f'{"".join(trs)}'
+        "</tbody></table></form></div></div></div></body></html>"
+    )
+    return page.encode("utf-8")
+
+
+def load_pages(paths: list[str]) -> list[bytes]:
+    if not paths:
+        return [chapter_page()]
+
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    return pages
@@ -82,6 +82,9 @@ COVER_XML = six.b('''<?xml version="1.0" encoding="UTF-8"?>
 
 IMAGE_MEDIA_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/svg+xml']
 
+# stored in the zip as they are
+COMPRESSED_MEDIA_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
+
 
 # TOC and navigation elements
 
@@ -529,6 +532,25 @@ class EpubImage(EpubItem):
         return '<EpubImage:%s:%s>' % (self.id, self.file_name)
 
 
+class EpubImageFile(EpubImage):
+
+    """
+    Represents Image in the EPUB file whose content stays in a file on disk.
+    Writers copy the file into the EPUB file, it is never loaded into memory whole.
+    """
+
+    def __init__(self, uid=None, file_name='', media_type='', path=''):
+        super(EpubImageFile, self).__init__(uid=uid, file_name=file_name, media_type=media_type)
+        self.path = path
+
+    def get_content(self, default=six.b('')):
+        with open(self.path, 'rb') as f:
+            return f.read() or default
+
+    def __str__(self):
+        return '<EpubImageFile:%s:%s>' % (self.id, self.file_name)
+
+
 class EpubSMIL(EpubItem):
 
     def __init__(self, uid=None, file_name='', content=None):
@@ -1350,6 +1372,18 @@ class EpubWriter(object):
 
         return tree_str
 
+    def _compress_type(self, item):
+        # raster images are compressed already, deflating them again only costs time
+        if item.media_type in COMPRESSED_MEDIA_TYPES:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def _write_content(self, name, item):
+        if isinstance(item, EpubImageFile):
+            self.out.write(item.path, name, compress_type=self._compress_type(item))
+        else:
+            self.out.writestr(name, item.get_content(), compress_type=self._compress_type(item))
+
     def _write_items(self):
         for item in self.book.get_items():
             if isinstance(item, EpubNcx):
@@ -1357,9 +1391,9 @@ class EpubWriter(object):
             elif isinstance(item, EpubNav):
                 self.out.writestr('%s/%s' % (self.book.FOLDER_NAME, item.file_name), self._get_nav(item))
             elif item.manifest:
-                self.out.writestr('%s/%s' % (self.book.FOLDER_NAME, item.file_name), item.get_content())
+                self._write_content('%s/%s' % (self.book.FOLDER_NAME, item.file_name), item)
             else:
-                self.out.writestr('%s' % item.file_name, item.get_content())
+                self._write_content('%s' % item.file_name, item)
 
     def write(self):
         # check for the option allowZip64
@@ -1373,6 +1407,101 @@ class EpubWriter(object):
         self.out.close()
 
 
+class EpubStreamWriter(EpubWriter):
+
+    """
+    Writes items into the EPUB file as soon as they are added and drops their content,
+    so memory does not grow with the size of the book. Package document, NCX and
+    navigation are written last, from the metadata that is left.
+
+    >>> writer = EpubStreamWriter('book.epub', book)
+    >>> writer.open()
+    >>> writer.add_item(chapter)
+    >>> writer.close()
+
+    Items must be added through the writer once it is open. Page list is disabled,
+    it needs the body of every document.
+    """
+
+    def __init__(self, name, book, options=None):
+        super(EpubStreamWriter, self).__init__(name, book, options)
+
+        self.options['epub3_pages'] = False
+        self.out = None
+
+    def open(self):
+        self.out = zipfile.ZipFile(self.file_name, 'w', zipfile.ZIP_DEFLATED)
+        self.out.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+
+        self._write_container()
+
+        for plg in self.options.get('plugins', []):
+            if hasattr(plg, 'before_write'):
+                plg.before_write(self.book)
+
+        # items added to the book before it was opened, e.g. the cover
+        for item in self.book.get_items():
+            self._write_item(item)
+
+    def _write_item(self, item):
+        # written from the final toc and spine in close()
+        if isinstance(item, (EpubNcx, EpubNav)):
+            return
+
+        if isinstance(item, EpubHtml):
+            for plg in self.options.get('plugins', []):
+                if hasattr(plg, 'html_before_write'):
+                    plg.html_before_write(self.book, item)
+
+        if item.manifest:
+            self._write_content('%s/%s' % (self.book.FOLDER_NAME, item.file_name), item)
+        else:
+            self._write_content('%s' % item.file_name, item)
+
+        item.content = six.b('')
+
+    def add_item(self, item):
+        """
+        Add item to the book and write it to the EPUB file right away.
+
+        :Args:
+          - item: Item instance
+
+        :Returns:
+          Returns the added item.
+        """
+        self.book.add_item(item)
+        self._write_item(item)
+
+        return item
+
+    def set_cover(self, file_name, content, create_page=True):
+        """
+        Set cover of the book and write the cover image and page right away.
+
+        :Args:
+          - file_name: file name of the cover page
+          - content: Content for the cover image
+          - create_page: Should cover page be defined. Defined as bool value (optional). Default value is True.
+        """
+        written = len(self.book.items)
+        self.book.set_cover(file_name, content, create_page)
+
+        for item in self.book.items[written:]:
+            self._write_item(item)
+
+    def close(self):
+        self._write_opf()
+
+        for item in self.book.get_items():
+            if isinstance(item, EpubNcx):
+                self.out.writestr('%s/%s' % (self.book.FOLDER_NAME, item.file_name), self._get_ncx())
+            elif isinstance(item, EpubNav):
+                self.out.writestr('%s/%s' % (self.book.FOLDER_NAME, item.file_name), self._get_nav(item))
+
+        self.out.close()
+
+
 class EpubReader(object):
     DEFAULT_OPTIONS = {
         'ignore_ncx': False
@@ -3,6 +3,9 @@ import os
 import sys
 
 from parser2.command import Receiver, BookCommand, Invoker
+from parser2.images import ImageBudget, ImageMode
+from parser2.limiter import DEFAULT_MAX_CONCURRENCY, DEFAULT_MIN_CONCURRENCY
+from parser2.optimize import DEFAULT_FORMAT, DEFAULT_MAX_DIMENSION, DEFAULT_QUALITY
 
 
 def init_argparse() -> argparse.ArgumentParser:
@@ -15,12 +18,110 @@ def init_argparse() -> argparse.ArgumentParser:
         help="Desired file format for the output.\n1 for EPUB, 2 for TXT.Example: main.py(Main.exe) --file_format=2 ",
         default=2,
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write chapters to the output file as soon as they are downloaded.",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Do not use the on-disk page cache.",
+    )
+    parser.add_argument(
+        "--revalidate",
+        action="store_true",
+        help="Revalidate cached chapter pages with a conditional GET.",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Only download chapters added or changed since the last export.",
+    )
+    parser.add_argument(
+        "--min_concurrency",
+        type=int,
+        help="Lowest number of requests in flight the adaptive limiter may go down to.",
+        default=DEFAULT_MIN_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        help="Highest number of requests in flight the adaptive limiter may go up to.",
+        default=DEFAULT_MAX_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--images",
+        type=str,
+        choices=["off", "cover", "all"],
+        help="Which images go into an EPUB: none, the cover only, or all of them.",
+        default="cover",
+    )
+    parser.add_argument(
+        "--image_budget_mb",
+        type=float,
+        help="Most megabytes of chapter images per book, the rest are skipped.",
+    )
+    parser.add_argument(
+        "--image_max_mb",
+        type=float,
+        help="Skip chapter images larger than this many megabytes.",
+    )
+    parser.add_argument(
+        "--image_max_count",
+        type=int,
+        help="Most chapter images per book, the rest are skipped.",
+    )
+    parser.add_argument(
+        "--optimize_images",
+        action="store_true",
+        help="Downscale and recompress images before packaging them (needs Pillow).",
+    )
+    parser.add_argument(
+        "--image_max_size",
+        type=int,
+        help="Largest width or height of an optimized image, in pixels.",
+        default=DEFAULT_MAX_DIMENSION,
+    )
+    parser.add_argument(
+        "--image_quality",
+        type=int,
+        help="JPEG/WebP quality of optimized images, 1-100.",
+        default=DEFAULT_QUALITY,
+    )
+    parser.add_argument(
+        "--image_format",
+        type=str,
+        choices=["JPEG", "WEBP"],
+        help="Format large PNG images are converted to.",
+        default=DEFAULT_FORMAT,
+    )
+    parser.add_argument(
+        "--no_pretty_print",
+        action="store_true",
+        help=(
+            "Write EPUB chapters compact, as rendered: no indentation, and no "
+            "parsing them again while packaging the book, which is faster."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes that parse chapters, 0 parses them alongside the downloads.",
+        default=0,
+    )
     return parser
 
 
-def execute_command(book_url: str, file_format: int = 2):
+def megabytes(value: float) -> int:
+    return int(value * 1024 * 1024) if value is not None else None
+
+
+def execute_command(book_url: str, file_format: int = 2, **options):
     receiver = Receiver()
-    cmd = BookCommand(receiver=receiver, book_url=book_url, file_format=file_format)
+    cmd = BookCommand(
+        receiver=receiver, book_url=book_url, file_format=file_format, **options
+    )
     invoker = Invoker()
     invoker.command(cmd=cmd)
     invoker.execute()
@@ -32,7 +133,33 @@ def main():
     args = parser.parse_args()
 
     if len(sys.argv) > 1:
-        execute_command(args.book_url, args.file_format)
+        execute_command(
+            args.book_url,
+            args.file_format,
+            stream=args.stream,
+            cache=not args.no_cache,
+            revalidate=args.revalidate,
+            update=args.update,
+            client_options={
+                "min_concurrency": args.min_concurrency,
+                "max_concurrency": args.max_concurrency,
+            },
+            image_mode=ImageMode[args.images.upper()],
+            image_budget=ImageBudget(
+                max_bytes=megabytes(args.image_budget_mb),
+                max_image_bytes=megabytes(args.image_max_mb),
+                max_count=args.image_max_count,
+            ),
+            image_options={
+                "max_dimension": args.image_max_size,
+                "quality": args.image_quality,
+                "format": args.image_format,
+            }
+            if args.optimize_images
+            else None,
+            pretty_print=not args.no_pretty_print,
+            workers=args.workers,
+        )
     else:
         try:
             print("Press Enter to continue or Ctrl+C to exit")
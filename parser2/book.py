@@ -1,36 +1,45 @@
+import asyncio
 import os
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from enum import Enum
 
 import httpx
 import xxhash
-from bs4 import BeautifulSoup
 from lxml import etree
 
 from ebooklib import epub
-from parser2 import mimetype
+from ebooklib.utils import parse_string
+from parser2 import document, mimetype, render, toc
+from parser2.cache import HttpCache
+from parser2.client import SharedClient
+from parser2.images import (
+    Image,
+    ImageBudget,
+    ImageMode,
+    ImageRegistry,
+    ImageTooLarge,
+    image_filename,
+)
+from parser2.journal import Journal
+from parser2.manifest import Manifest
+from parser2.optimize import ImageOptimizer, OptimizeOptions
+from parser2.retry import RetryPolicy
+from parser2.spool import TOO_LARGE, ImageSpool, hash_file, read_head
+from parser2.document import ParseMode
 
 
 # from typing import List
 
 
-@dataclass
-class Image:
-    filehash: str
-    filename: str
-    content: bytes
-    mimetype: str
-
-
 @dataclass
 class Chapter:
     url: str = ""
     title: str = ""
     filename: str = ""
     content: str = ""
+    id: str = ""
 
 
 @dataclass
@@ -41,38 +50,108 @@ class Volume:
     chapters: list[Chapter] = field(default_factory=list)
 
 
-def get_with_retry(
-    client: httpx.Client, url: str, retrys: int = 5, sleep_time: float = 2
+async def get_with_retry(
+    client: SharedClient, url: str, policy: RetryPolicy = None, **kwargs
 ):
-    response = None
+    """
+    GET url, retrying as the policy allows. Returns None when the page can not be had.
+    """
+    if policy is None:
+        policy = RetryPolicy()
+
+    # the deadline runs from the first send, not from the wait for a slot before it
+    start = None
+    attempt = 0
+
+    def on_send():
+        nonlocal start
+        if start is None:
+            start = time.monotonic()
+
+    while True:
+        response = None
+        error = None
+        try:
+            response = await client.get(url, on_send=on_send, **kwargs)
+        except (httpx.TransportError, httpx.InvalidURL) as e:
+            error = e
+            policy.stats.transport_errors += 1
+            print(f"[ERR] get_with_retry - {e!r} - url:{url}")
 
-    for i in range(0, retrys):
-        response = client.get(url)
-        if response.status_code == httpx.codes.OK:
+        if response is not None and response.status_code == httpx.codes.OK:
+            return response
+
+        attempt += 1
+        if attempt >= policy.max_attempts or not policy.should_retry(response, error):
             break
-        else:
-            time.sleep(sleep_time)
 
-    if response.status_code == httpx.codes.OK:
-        return response
-    else:
-        print(
-            f"[ERR] get_with_retry - response.status_code != httpx.codes.OK - url:{url}"
-        )
-        return None
+        delay = policy.delay(attempt, response)
+        if start is not None and time.monotonic() - start + delay > policy.deadline:
+            break
+
+        policy.stats.retries += 1
+        policy.stats.backoff += delay
+        await asyncio.sleep(delay)
+
+    policy.stats.gave_up += 1
+    status = response.status_code if response is not None else None
+    print(f"[ERR] get_with_retry - giving up - status: {status} - url:{url}")
+    return None
 
 
 def generate_volume_content(title):
     return f'  <h1 style="text-align: center;">{title}</h1>\n'
 
 
+class CompactHtml(epub.EpubHtml):
+    """
+    EPUB chapter written as it was rendered. EpubHtml.get_content parses the content
+    again and pretty prints the whole document, here only the document around the
+    content is built and the chapter bytes go into its body as they are.
+    """
+
+    def get_content(self, default=None):
+        tree = parse_string(self.book.get_template(self._template_name))
+        root = tree.getroot()
+
+        lang = self.lang or self.book.language
+        root.set("lang", lang)
+        root.set("{%s}lang" % epub.NAMESPACES["XML"], lang)
+
+        head = etree.SubElement(root, "head")
+        if self.title != "":
+            etree.SubElement(head, "title").text = self.title
+        etree.SubElement(root, "body")
+
+        content = self.content or b""
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        document = etree.tostring(tree, encoding="utf-8", xml_declaration=True)
+        return document.replace(b"<body/>", b"<body>" + content + b"</body>", 1)
+
+
 DEFAULT_VOLUME_TITILE = "Том 0"
 DEFAULT_VOLUME_FILENAME = "volume-0.xhtml"
 DEFAULT_VOLUME_CONTENT = generate_volume_content("Том 0")
 
 BASE_URL = "https://tl.rulate.ru"
-ENABLE_IMAGES = False
 BASE_DIR = os.path.join(os.getcwd(), "Ranobe")
+CACHE_FILE = os.path.join(BASE_DIR, ".cache", "http.sqlite3")
+IMAGE_CACHE_DIR = os.path.join(BASE_DIR, ".cache", "images")
+
+
+# how many chapters may be downloaded ahead of the first one not yet consumed
+DEFAULT_REORDER_WINDOW = 64
+
+TXT_BUFFER_SIZE = 1024 * 1024
+
+IMAGE_SRC_RE = re.compile(rb'src="\.\./Images/([^"]+)"')
+
+
+def image_filenames(content) -> list[str]:
+    if not isinstance(content, bytes):
+        return []
+    return [filename.decode("utf-8") for filename in IMAGE_SRC_RE.findall(content)]
 
 
 class FileFormat(Enum):
@@ -84,17 +163,83 @@ class Book:
     title: str = ""
     description: str = ""
     language: str = "ru"
-    volumes: list[Volume] = []
-    images: dict = {}
+    volumes: list[Volume]
+    images: ImageRegistry
     uid: str = ""
     cookies: str = {}
-    cover: Image
+    cover: Image = None
     file_format: FileFormat
-
-    def __init__(self, url: str, file_format: FileFormat):
+    parse_mode: ParseMode = ParseMode.LXML
+
+    def __init__(
+        self,
+        url: str,
+        file_format: FileFormat,
+        client_options: dict = None,
+        stream: bool = False,
+        cache: bool = True,
+        revalidate: bool = False,
+        update: bool = False,
+        resume: bool = True,
+        retry_policy: RetryPolicy = None,
+        image_options: dict = None,
+        image_mode: ImageMode = ImageMode.COVER,
+        image_budget: ImageBudget = None,
+        pretty_print: bool = True,
+        workers: int = 0,
+    ):
         self.url = str(url)
 
         self.file_format = file_format
+        self.stream = stream
+        self.revalidate = revalidate
+        self.update = update
+        self.resume = resume
+        self.manifest: Manifest = None
+        self.journal: Journal = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.optimizer: ImageOptimizer = None
+        self.image_mode = image_mode
+        # indented chapter XHTML. Compact chapters skip the indent pass over the tree
+        # and are packaged as they are, without being parsed again for the EPUB
+        self.pretty_print = pretty_print
+        self.chapter_html = epub.EpubHtml if pretty_print else CompactHtml
+        # chapters are parsed in a process pool, the slice of the page fed to it
+        # comes from ContentFeed, so only with lxml
+        self.renderer: render.ChapterRenderer = None
+        if workers and self.parse_mode == ParseMode.LXML:
+            self.renderer = render.ChapterRenderer(workers)
+
+        if image_options is not None:
+            if ImageOptimizer.available():
+                self.optimizer = ImageOptimizer(
+                    OptimizeOptions(**image_options), IMAGE_CACHE_DIR
+                )
+            else:
+                print("[ERR] Book - Pillow is not installed, images are not optimized")
+
+        self.volumes = []
+        # (vol_i, ch_i, chapter) in book order, grows while the TOC is read
+        self.jobs = []
+        self.toc_task: asyncio.Task = None
+        self.toc_done = False
+        self.header_ready = asyncio.Event()
+        self.jobs_changed = asyncio.Event()
+        self.cover_task: asyncio.Task = None
+        self.spool = ImageSpool()
+        self.images = ImageRegistry(
+            self.download_image,
+            on_image=self.store_image,
+            budget=image_budget,
+        )
+
+        # every fetch of the book runs on this loop, through one pooled client
+        self.loop = asyncio.new_event_loop()
+        self.client = SharedClient(
+            cookies=self.cookies,
+            cache=HttpCache(CACHE_FILE) if cache else None,
+            **(client_options or {}),
+        )
 
         self.volumes.append(
             Volume(
@@ -102,6 +247,14 @@ class Book:
             )
         )
 
+    @property
+    def streaming(self) -> bool:
+        """
+        True when chapters are downloaded while the output file is being written,
+        so parse_chapters must not be called before save.
+        """
+        return self.stream
+
     def print_content(self):
         print(self.title)
         for vol in self.volumes:
@@ -109,27 +262,87 @@ class Book:
             for ch in vol.chapters:
                 print(f"│   ├── {ch.title:<90}    ({ch.filename})")
 
-    def download_image(self, url) -> Image:
-        with httpx.Client(timeout=10, http2=True, cookies=self.cookies) as client:
-            response = get_with_retry(client, url)
-            if response:
-                raw = response.content
-                img_ext, img_mime = mimetype.get_file_extension(raw)
-                if img_ext:
-                    img_hash = xxhash.xxh3_128_hexdigest(raw)
-                    return Image(
-                        filehash=img_hash,
-                        filename=f"{img_hash}{img_ext}",
-                        content=raw,
-                        mimetype=img_mime,
-                    )
-                else:
-                    print(
-                        f"[ERR] Book.download_image - Invalid file extension. url: {url}"
-                    )
-                    return None
+    def run(self, coro):
+        """
+        Sync facade: run a coroutine of this book to completion on its event loop.
+        """
+        return self.loop.run_until_complete(coro)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+        # tasks left behind by an interrupted run, e.g. Ctrl+C
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.run(asyncio.gather(*pending, return_exceptions=True))
+
+        self.run(self.client.aclose())
+        self.loop.close()
+        if self.optimizer is not None:
+            self.optimizer.close()
+            print(f"[INF] Book.close - optimizer - bytes saved: {self.optimizer.saved}")
+        if self.renderer is not None:
+            self.renderer.close()
+        self.spool.remove()
+        print(f"[INF] Book.close - client - {self.client.stats}")
+        print(f"[INF] Book.close - retry - {self.retry_policy.stats}")
+        if self.images.stats.requested:
+            print(f"[INF] Book.close - images - {self.images.stats}")
+
+    async def download_image(self, url, max_size: int = None) -> Image:
+        # the body goes straight to disk, hashed as it arrives
+        spool = self.spool.create(accept=mimetype.is_image, max_size=max_size)
+        try:
+            response = await get_with_retry(
+                self.client, url, self.retry_policy, sink=spool
+            )
+        finally:
+            spool.close()
+
+        if response and spool.rejected:
+            print(
+                f"[ERR] Book.download_image - {spool.rejected}, aborted after "
+                f"{spool.size} bytes. url: {url}"
+            )
+        elif response:
+            img_ext, img_mime = mimetype.get_file_extension(spool.head)
+            if img_ext:
+                img_hash = spool.hexdigest()
+                path = spool.path
+                if self.optimizer is not None:
+                    path = await self.optimizer.optimize(img_hash, path)
+                    if path != spool.path:
+                        # may come back in another format
+                        head = read_head(path)
+                        img_ext, img_mime = mimetype.get_file_extension(head)
+                        spool.discard()
+
+                return Image(
+                    filehash=img_hash,
+                    filename=f"{img_hash}{img_ext}",
+                    path=path,
+                    mimetype=img_mime,
+                    size=os.path.getsize(path),
+                    spooled=path == spool.path,
+                )
+            else:
+                print(
+                    f"[ERR] Book.download_image - Invalid file extension. url: {url}"
+                )
+
+        spool.discard()
+        if spool.rejected == TOO_LARGE:
+            raise ImageTooLarge(url)
+        return None
 
     def img_work(self, img):
+        """
+        Hand the image over to the book-wide download stage and point src at the file
+        it will be saved as, without waiting for the download.
+        """
         if img is None:
             return
 
@@ -138,190 +351,540 @@ class Book:
         if not img_src:
             return
 
-        img_url = img_src
+        filename = self.images.enqueue(render.image_url(img_src, BASE_URL))
 
-        if img_src[0:1] == "/":
-            img_url = BASE_URL + img_src
-
-        image = self.download_image(img_url)
-
-        if not image:
+        if filename is None:
+            # over the image budget
             img.getparent().remove(img)
             return
 
-        self.images[image.filehash] = image
+        render.point_image(img, filename)
 
-        img.set("src", f"../Images/{image.filename}")
-        img.set("alt", f"x{image.filename}")
-        img.set("style", "display:block;margin-left:auto;margin-right:auto;")
+    async def fetch_content(self, url: str, revalidate: bool = False):
+        """
+        Download a chapter page and return its parsed root, None if it can not be had.
+        With lxml only the content-text div is kept from the chunks as they arrive,
+        and only that div is parsed.
+        """
+        if self.parse_mode != ParseMode.LXML:
+            response = await get_with_retry(
+                self.client,
+                url,
+                self.retry_policy,
+                cache=True,
+                revalidate=self.revalidate or revalidate,
+            )
+            if not response:
+                return None
+            return document.parse_response(response, self.parse_mode)
+
+        feed = await self.fetch_feed(url, revalidate)
+        if feed is None:
+            return None
+        return feed.close()
+
+    async def fetch_feed(
+        self, url: str, revalidate: bool = False
+    ) -> document.ContentFeed:
+        """
+        Download a chapter page, keeping the bytes of its content-text div.
+        None if it can not be had.
+        """
+        feed = document.ContentFeed()
+        response = await get_with_retry(
+            self.client,
+            url,
+            self.retry_policy,
+            cache=True,
+            revalidate=self.revalidate or revalidate,
+            sink=feed,
+        )
+        if not response:
+            return None
+        return feed
+
+    async def parse_chapter(
+        self, vol_i, ch_i, chapter: Chapter, revalidate: bool = False
+    ) -> Chapter:
+        new_ch = chapter
+        images = (
+            self.image_mode == ImageMode.ALL and self.file_format == FileFormat.EPUB
+        )
 
-    def parse_chapter(self, vol_i, ch_i, chapter: Chapter) -> Chapter:
-        with httpx.Client(timeout=10, cookies=self.cookies) as client:
-            new_ch = chapter
-            response = get_with_retry(client, new_ch.url)
+        if self.renderer is not None:
+            feed = await self.fetch_feed(new_ch.url, revalidate)
+            if feed is not None:
+                new_ch.content = await self.render_chapter(feed, new_ch.title, images)
 
-            if response:
-                soup = BeautifulSoup(response.content, "html.parser")
-                root = etree.HTML(str(soup))
-
-                content_text = root.xpath('//*[@class="content-text"]')[0]
-
-                if ENABLE_IMAGES:
-                    if self.file_format == FileFormat.EPUB:
-                        with ThreadPoolExecutor(max_workers=4) as pool:
-                            images = content_text.xpath(".//img")
-                            pool.map(self.img_work, images)
-
-                # cleanup
-                for p in content_text.xpath(".//p"):
-                    if len(p) == 0:
-                        if p.text is not None:
-                            if p.text == "":
-                                p.getparent().remove(p)
-                                new_ch.context = p.getparent().remove(p)
-                        else:
-                            p.getparent().remove(p)
-
-                for i in content_text.xpath(".//*"):
-                    style = i.get("style")
-                    if style is not None:
-                        style = re.sub(R"margin-left:[\s]*0cm[;]*", R"", style)
-                        style = re.sub(R"margin-right:[\s]*0cm[;]*", R"", style)
-                        style = re.sub(R"text-indent:[\s]*[\d\.]*p[xt][;]*", R"", style)
-                        style = re.sub(
-                            R"(mso-bidi-|)font-size:[\s]*[\d\.]*p[xt][;]*", R"", style
-                        )
-                        style = re.sub(
-                            R'(mso-bidi-|mso-fareast-|)font-family:[\s]*[\w\s\'",]*[;]*',
-                            R"",
-                            style,
-                        )
-                        style = re.sub(R"line-height:[\s]*[\d\.]*%[;]*", R"", style)
-                        style = re.sub(
-                            R'(background-|)color:[\s]*(#|)[\w\d\'"-]*[;]*', R"", style
-                        )
-                        i.set("style", style)
-
-                xml_body = etree.Element("div")
-                xml_body.append(etree.fromstring("<h2>{}</h2>".format(new_ch.title)))
-                xml_body.append(content_text)
-
-                etree.indent(xml_body, space="\t")
-                new_ch.content = etree.tostring(
-                    xml_body,
-                    # doctype="<!DOCTYPE html>",
-                    encoding="UTF-8",
-                    method="xml",
-                    pretty_print=True,
-                    with_tail=False,
-                    # xml_declaration=True,
+        else:
+            root = await self.fetch_content(new_ch.url, revalidate)
+            if root is not None:
+                content_text = render.CONTENT_XPATH(root)[0]
+                new_ch.content = render.build_xhtml(
+                    content_text,
+                    new_ch.title,
+                    self.pretty_print,
+                    self.img_work if images else None,
                 )
 
-            print(f"[INF] Book.parse_chapter - completed - filename: {new_ch.filename}")
-            return vol_i, ch_i, new_ch
+        print(
+            f"[INF] Book.parse_chapter - completed - filename: {new_ch.filename}"
+            f" - limit: {self.client.limiter.current}"
+        )
+        return vol_i, ch_i, new_ch
 
-    def parse_chapter2(self, vol_i, ch_i, chapter: Chapter) -> Chapter:
-        with httpx.Client(timeout=10, cookies=self.cookies) as client:
-            new_ch = chapter
-            response = get_with_retry(client, new_ch.url)
+    async def render_chapter(
+        self, feed: document.ContentFeed, title: str, images: bool
+    ) -> bytes:
+        """
+        Render a chapter in the process pool. The image URLs it comes back with are
+        enqueued here, in document order; when some no longer fit the budget the
+        chapter is rendered again without them.
+        """
+        args = (
+            feed.content(),
+            feed.encoding,
+            title,
+            self.pretty_print,
+            images,
+            BASE_URL,
+        )
+        content, urls = await self.renderer.xhtml(*args)
 
-            if response:
-                soup = BeautifulSoup(response.content, "html.parser")
-                root = etree.HTML(str(soup))
-                content_elements = root.xpath('//div[@class="content-text"]//text()')
-                content_text = "".join(content_elements)
-
-                content_text = re.sub(
-                    r"\w+:\/{2}[\d\w-]+(\.[\d\w-]+)*(?:(?:\/[^\s/]*))*",
-                    "",
-                    content_text,
-                )
-                new_ch.content = content_text
+        dropped = set()
+        for url in urls:
+            if self.images.enqueue(url) is None:
+                dropped.add(image_filename(url))
+
+        if dropped:
+            content, _ = await self.renderer.xhtml(*args, frozenset(dropped))
+        return content
 
-            return vol_i, ch_i, new_ch
+    async def parse_chapter2(
+        self, vol_i, ch_i, chapter: Chapter, revalidate: bool = False
+    ) -> Chapter:
+        new_ch = chapter
+
+        if self.renderer is not None:
+            feed = await self.fetch_feed(new_ch.url, revalidate)
+            if feed is not None:
+                new_ch.content = await self.renderer.text(feed.content(), feed.encoding)
+
+        else:
+            root = await self.fetch_content(new_ch.url, revalidate)
+            if root is not None:
+                new_ch.content = render.extract_text(root)
+
+        print(
+            f"[INF] Book.parse_chapter2 - completed - filename: {new_ch.filename}"
+            f" - limit: {self.client.limiter.current}"
+        )
+        return vol_i, ch_i, new_ch
 
     def parse(self):
-        with httpx.Client(timeout=10, cookies=self.cookies) as client:
-            response = get_with_retry(client, self.url)
+        self.run(self.parse_async())
+
+    async def parse_async(self):
+        """
+        Start reading the index and return as soon as the book header is known.
+        The chapter table keeps streaming in the background: every chapter is appended
+        to self.jobs as soon as its row arrives, so chapter downloads start while the
+        TOC is still being read, and the cover is downloaded alongside.
+        """
+        self.uid = "idtlrulate" + self.url.split("/")[-1:][0]
+        self.toc_task = asyncio.ensure_future(self.read_toc())
+
+        header = asyncio.ensure_future(self.header_ready.wait())
+        await asyncio.wait((self.toc_task, header), return_when=asyncio.FIRST_COMPLETED)
+        header.cancel()
+        if self.toc_task.done():
+            self.toc_task.result()
+
+    async def read_toc(self):
+        feed = toc.TocFeed(
+            self.parse_header, self.add_volume, self.add_chapter, BASE_URL
+        )
+        try:
+            # the index is where new chapters show up, never answer it from disk blindly
+            response = await get_with_retry(
+                self.client,
+                self.url,
+                self.retry_policy,
+                cache=True,
+                revalidate=True,
+                sink=feed,
+            )
             if response:
-                soup = BeautifulSoup(response.content, "html.parser")
-                root = etree.HTML(str(soup))
-                # print(etree.tostring(root, pretty_print=True, encoding="unicode"))
-
-                self.uid = "idtlrulate" + self.url.split("/")[-1:][0]
-                self.title = root.xpath("/html/body/div[2]/div[3]/div[1]/h1")[
-                    0
-                ].text.split(" / ")[-1:][0]
-                self.description = "".join(
-                    root.xpath("/html/body/div[2]/div[3]/div[1]/div[1]/div[3]")[
-                        0
-                    ].itertext()
-                )
+                feed.close()
+        finally:
+            self.toc_done = True
+            self.header_ready.set()
+            self.jobs_changed.set()
+
+        if self.manifest is not None:
+            self.report_manifest()
+
+    def parse_header(self, root):
+        self.title = toc.TITLE_XPATH(root)[0].text.split(" / ")[-1:][0]
+        self.description = "".join(toc.DESCRIPTION_XPATH(root)[0].itertext())
+
+        if self.file_format == FileFormat.EPUB and self.image_mode != ImageMode.OFF:
+            cover_url = toc.COVER_XPATH(root)[0].get("src")
+            if cover_url[0:1] == "/":
+                cover_url = BASE_URL + cover_url
+            print(cover_url)
+            self.cover_task = asyncio.ensure_future(self.download_image(cover_url))
+
+        # the title is known, so is where the book goes
+        if self.resume:
+            self.open_journal()
+        if self.update:
+            self.open_manifest()
+
+        self.header_ready.set()
+
+    def add_volume(self, volume: toc.TocVolume):
+        self.volumes += [
+            Volume(
+                volume.title,
+                f"volume-{len(self.volumes)}.xhtml",
+                generate_volume_content(volume.title),
+            )
+        ]
+
+    def add_chapter(self, entry: toc.TocChapter):
+        chapters = self.volumes[entry.volume_index].chapters
+        chapters += [
+            Chapter(
+                entry.url,
+                entry.title,
+                f"chapter-{entry.chapter_id}.xhtml",
+                id=entry.chapter_id,
+            )
+        ]
+        self.jobs.append((entry.volume_index, len(chapters) - 1, chapters[-1]))
+        self.jobs_changed.set()
 
-                if self.file_format == FileFormat.EPUB:
-                    cover_url = root.xpath('//*[@class="slick"]/div/img')[0].get("src")
-                    if cover_url[0:1] == "/":
-                        cover_url = BASE_URL + cover_url
-                    print(cover_url)
-                    self.cover = self.download_image(cover_url)
+    async def wait_for_jobs(self, count: int) -> bool:
+        """
+        Wait until more than count chapters are known. False once the TOC is read
+        and there are no more.
+        """
+        while len(self.jobs) <= count and not self.toc_done:
+            self.jobs_changed.clear()
+            await self.jobs_changed.wait()
+
+        if len(self.jobs) > count:
+            return True
+        # a failed index download ends the book here
+        if self.toc_task.done():
+            self.toc_task.result()
+        return False
+
+    async def wait_cover(self):
+        if self.cover_task is not None:
+            self.cover = await self.cover_task
+            self.cover_task = None
 
-                table = root.xpath(
-                    "/html/body/div[2]/div[3]/div[1]/form/table/tbody/tr"
+    def parse_chapters(self):
+        self.run(self.parse_chapters_async())
+
+    def chapter_jobs(self):
+        """
+        Yield (vol_i, ch_i, chapter) for every chapter, in book order.
+        """
+        for vol_i in range(0, len(self.volumes)):
+            for ch_i in range(0, len(self.volumes[vol_i].chapters)):
+                yield vol_i, ch_i, self.volumes[vol_i].chapters[ch_i]
+
+    async def parse_job(self, vol_i, ch_i, chapter: Chapter):
+        if self.file_format == FileFormat.EPUB:
+            parse_chapter = self.parse_chapter
+        else:
+            parse_chapter = self.parse_chapter2
+
+        if self.journal is not None and self.load_from_journal(chapter):
+            if self.manifest is not None and not self.manifest.is_unchanged(
+                chapter.id, chapter.url, chapter.title
+            ):
+                # finished before the run was interrupted, the manifest never got it
+                self.store_restored_in_manifest(chapter)
+            return vol_i, ch_i, chapter
+
+        if self.manifest is not None and self.load_from_manifest(chapter):
+            return vol_i, ch_i, chapter
+
+        # a chapter added or changed since the last export must not come from the
+        # page cache, it may hold the old body
+        revalidate = self.manifest is not None
+
+        try:
+            result = await parse_chapter(vol_i, ch_i, chapter, revalidate)
+        except Exception as e:
+            # one broken chapter is left empty, like a download that gave up,
+            # instead of cancelling the rest of the book
+            print(f"[ERR] Book.parse_job - failed - error: {e!r} - url:{chapter.url}")
+            chapter.content = ""
+            return vol_i, ch_i, chapter
+
+        if chapter.content:
+            if self.journal is not None:
+                self.store_in_journal(chapter)
+            if self.manifest is not None:
+                self.store_in_manifest(chapter)
+
+        return result
+
+    def restore_images(self, content: bytes, find_image) -> bool:
+        """
+        Register the images a stored chapter refers to. False if any of them is missing.
+        """
+        images = []
+        for filename in IMAGE_SRC_RE.findall(content):
+            filename = filename.decode("utf-8")
+            path = find_image(filename)
+            if path is None:
+                return False
+
+            img_ext, img_mime = mimetype.get_file_extension(read_head(path))
+            if img_ext is None:
+                return False
+
+            images.append(
+                Image(
+                    filehash=hash_file(path),
+                    filename=filename,
+                    path=path,
+                    mimetype=img_mime,
+                    size=os.path.getsize(path),
                 )
+            )
 
-                vol_i = 0
-                for row in table:
-                    if row.get("id"):
-                        # print(etree.tostring(row, pretty_print=True, encoding="unicode"))
-                        if row.get("id")[0:3] == "vol":
-                            vol_i += 1
-                            voltitle = row.xpath("td/strong")[0].text
-
-                            self.volumes += [
-                                Volume(
-                                    voltitle,
-                                    f"volume-{vol_i}.xhtml",
-                                    generate_volume_content(voltitle),
-                                )
-                            ]
-
-                        elif row.get("id")[0:1] == "c":
-                            a = row.xpath("td/a")
-                            if len(a) > 1:
-                                curl = BASE_URL + a[0].get("href")
-                                ctitle = a[0].text
-                                ctitle = re.sub(R"[\s]*(.*)", R"\1", ctitle)
-                                ctitle = re.sub(R"[\s]{2,}", R" ", ctitle)
-                                cid = row.get("id").split("_")[1]
-
-                                self.volumes[-1:][0].chapters += [
-                                    Chapter(curl, ctitle, f"chapter-{cid}.xhtml")
-                                ]
+        for image in images:
+            self.images.add(image)
+        return True
 
-    def parse_chapters(self):
-        with ThreadPoolExecutor(max_workers=8) as pool:
-            futures = []
-
-            for vol_i in range(0, len(self.volumes)):
-                for ch_i in range(0, len(self.volumes[vol_i].chapters)):
-                    if self.file_format == FileFormat.EPUB:
-                        pool.submit(
-                            self.parse_chapter,
-                            vol_i,
-                            ch_i,
-                            self.volumes[vol_i].chapters[ch_i],
-                        )
+    def package_images(self, content, entries: dict[str, Image]):
+        """
+        Chapter content as written into the EPUB: images with the same content share
+        one entry, entries get an extension, and images that could not be had are
+        left out. The entries used are collected in entries, to be written once.
+        """
+        if not isinstance(content, bytes) or not IMAGE_SRC_RE.search(content):
+            return content
+
+        def resolve(filename: str) -> str:
+            image = self.images.find(filename)
+            if image is None:
+                return None
+            entry = self.images.entry(image)
+            entries.setdefault(entry, image)
+            return entry
+
+        return render.package_images(content, resolve)
+
+    def store_image(self, image: Image):
+        """
+        Checkpoint a downloaded image. Its chapter may already be stored: a chapter
+        whose images are missing is simply downloaded again by a resumed run.
+        """
+        if self.journal is not None:
+            self.journal.write_image(image.filename, image.path)
+        if self.manifest is not None:
+            self.manifest.write_image(image.filename, image.path)
+
+    def open_journal(self):
+        ext = self.file_format.name.lower()
+        key = xxhash.xxh3_64_hexdigest(self.url.encode("utf-8"))
+        self.journal = Journal(os.path.join(BASE_DIR, ".journal", f"{key}-{ext}"))
+
+        if self.journal.entries:
+            print(
+                f"[INF] Book.open_journal - resuming - "
+                f"completed chapters: {len(self.journal.entries)}"
+            )
+
+    def load_from_journal(self, chapter: Chapter) -> bool:
+        entry = self.journal.get(chapter.filename, chapter.title)
+        if entry is None:
+            return False
+
+        if not entry.binary:
+            chapter.content = entry.content
+            return True
+
+        content = entry.content.encode("utf-8")
+        if not self.restore_images(content, self.journal.find_image):
+            return False
+
+        chapter.content = content
+        return True
+
+    def store_in_journal(self, chapter: Chapter):
+        self.journal.append(chapter.filename, chapter.title, chapter.content)
+
+    def open_manifest(self):
+        """
+        Open the manifest of the last export.
+        """
+        ext = self.file_format.name.lower()
+        self.manifest = Manifest(os.path.join(self.output_dir(), f".update-{ext}"))
+
+    def report_manifest(self):
+        """
+        Report how the fresh TOC differs from the last export.
+        """
+        ids = set()
+        unchanged = 0
+        for vol_i, ch_i, ch in self.chapter_jobs():
+            ids.add(ch.id)
+            if self.manifest.is_unchanged(ch.id, ch.url, ch.title):
+                unchanged += 1
+
+        removed = len(set(self.manifest.entries) - ids)
+        print(
+            f"[INF] Book.report_manifest - new or changed: {len(ids) - unchanged}, "
+            f"unchanged: {unchanged}, removed: {removed}"
+        )
+
+    def load_from_manifest(self, chapter: Chapter) -> bool:
+        """
+        Fill the chapter from the body stored by the last export, if it is still valid.
+        """
+        if not self.manifest.is_unchanged(chapter.id, chapter.url, chapter.title):
+            return False
+
+        content = self.manifest.read_body(chapter.id)
+        if content is None:
+            return False
+
+        if self.file_format == FileFormat.TXT:
+            chapter.content = content.decode("utf-8")
+            return True
+
+        if not self.restore_images(content, self.manifest.find_image):
+            return False
+
+        chapter.content = content
+        return True
+
+    def store_in_manifest(self, chapter: Chapter):
+        content = chapter.content
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        self.manifest.write_body(chapter.id, chapter.url, chapter.title, content)
+
+    def store_restored_in_manifest(self, chapter: Chapter):
+        """
+        Store a chapter restored from the journal, with its images: they were not
+        downloaded in this run, so store_image never saw them.
+        """
+        self.store_in_manifest(chapter)
+
+        for filename in image_filenames(chapter.content):
+            image = self.images.find(filename)
+            if image is not None:
+                self.manifest.write_image(image.filename, image.path)
+
+    async def iter_completed(self):
+        """
+        Yield (vol_i, ch_i, chapter) as soon as each chapter is parsed, in completion order.
+        Chapters are scheduled as soon as the TOC reader finds them.
+        Concurrency is bounded by the client semaphores, not by the number of tasks.
+        """
+        finished = asyncio.Queue()
+        tasks = []
+
+        async def schedule():
+            while await self.wait_for_jobs(len(tasks)):
+                for job in self.jobs[len(tasks) :]:
+                    task = asyncio.ensure_future(self.parse_job(*job))
+                    task.add_done_callback(finished.put_nowait)
+                    tasks.append(task)
+
+        scheduler = asyncio.ensure_future(schedule())
+        scheduler.add_done_callback(finished.put_nowait)
+        try:
+            completed = 0
+            while not scheduler.done() or completed < len(tasks):
+                task = await finished.get()
+                if task is scheduler:
+                    task.result()
+                    continue
+
+                completed += 1
+                yield task.result()
+        finally:
+            scheduler.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def iter_ordered(self, window: int = DEFAULT_REORDER_WINDOW):
+        """
+        Yield (vol_i, ch_i, chapter) in book order as soon as the contiguous prefix is ready.
+        At most `window` chapters are scheduled ahead of the next one to be yielded,
+        which bounds how many finished chapters wait in memory.
+        """
+        pending: dict[int, asyncio.Future] = {}
+        started = 0
+        i = 0
+
+        def fill():
+            nonlocal started
+            while started < len(self.jobs) and started < i + window:
+                pending[started] = asyncio.ensure_future(
+                    self.parse_job(*self.jobs[started])
+                )
+                started += 1
+
+        try:
+            while True:
+                if i == started and not await self.wait_for_jobs(i):
+                    break
+                fill()
+
+                # keep scheduling the chapters the TOC reader finds meanwhile
+                head = pending[i]
+                while not head.done() and not self.toc_done and started < i + window:
+                    more = asyncio.ensure_future(self.wait_for_jobs(started))
+                    await asyncio.wait(
+                        (head, more), return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if more.done():
+                        more.result()
                     else:
-                        pool.submit(
-                            self.parse_chapter2,
-                            vol_i,
-                            ch_i,
-                            self.volumes[vol_i].chapters[ch_i],
-                        )
+                        more.cancel()
+                    fill()
+
+                yield await pending.pop(i)
+                i += 1
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+    async def parse_chapters_async(self):
+        async for vol_i, ch_i, new_ch in self.iter_completed():
+            self.volumes[vol_i].chapters[ch_i] = new_ch
 
-            for future in as_completed(futures):
-                vol_i, ch_i, new_ch = future.result()
-                self.volumes[vol_i].chapters[ch_i] = new_ch
+        await self.images.drain()
+        await self.wait_cover()
+
+    def output_dir(self) -> str:
+        path = self.clean_title_to_path(self.title)
+        file_path = os.path.join(BASE_DIR, path)
+
+        if not os.path.exists(BASE_DIR):
+            os.mkdir(BASE_DIR)
+
+        if not os.path.exists(file_path):
+            os.mkdir(file_path)
+
+        return file_path
+
+    def output_file(self, ext: str) -> str:
+        path = self.clean_title_to_path(self.title)
+        return os.path.join(self.output_dir(), f"{path}.{ext}")
 
     def save_as_text(self):
         data: list = []
@@ -333,19 +896,34 @@ class Book:
                     text = f"\n{ch.title}\n{ch.content}"
                     data.append(text)
 
-        path = self.clean_title_to_path(self.title)
-        txt_file_path = os.path.join(BASE_DIR, path)
+        txt_file = self.output_file("txt")
 
-        if not os.path.exists(BASE_DIR):
-            os.mkdir(BASE_DIR)
+        with open(txt_file, "w", encoding="utf-8") as book:
+            book.write("\n".join(data))
 
-        if not os.path.exists(txt_file_path):
-            os.mkdir(txt_file_path)
+    async def save_as_text_streaming(self):
+        """
+        Download the chapters and append them to the TXT file in book order as soon as
+        the contiguous prefix is ready. Chapter content is dropped once written,
+        so memory is bounded by the reorder window rather than by the book size.
+        Output is identical to save_as_text.
+        """
+        txt_file = self.output_file("txt")
 
-        txt_file = os.path.join(txt_file_path, f"{path}.txt")
+        with open(txt_file, "w", encoding="utf-8", buffering=TXT_BUFFER_SIZE) as book:
+            sep = ""
+            last_vol_i = None
 
-        with open(txt_file, "w", encoding="utf-8") as book:
-            book.write("\n".join(data))
+            async for vol_i, ch_i, ch in self.iter_ordered():
+                if vol_i != last_vol_i:
+                    book.write(f"{sep}{self.volumes[vol_i].title}")
+                    sep = "\n"
+                    last_vol_i = vol_i
+
+                book.write(f"\n\n{ch.title}\n{ch.content}")
+                book.flush()
+
+                ch.content = ""
 
     def clean_title_to_path(self, title: str) -> str:
         return re.sub("[^a-zA-Z0-9\sА-Яа-яЁё]", "-", title)
@@ -360,12 +938,18 @@ class Book:
 
             ebook.spine.append("nav")
 
-            ebook.set_cover(
-                file_name=f"Images/{self.cover.filename}", content=self.cover.content
-            )
+            self.run(self.wait_cover())
+            if self.cover:
+                ebook.set_cover(
+                    file_name=f"Images/{self.cover.filename}",
+                    content=self.cover.read(),
+                )
 
             ebook.toc = []
 
+            self.run(self.images.drain())
+            entries = {}
+
             for vol in self.volumes:
                 if len(vol.chapters) > 0:
                     bookvol = epub.EpubHtml(
@@ -379,10 +963,10 @@ class Book:
                     bookchs = []
 
                     for ch in vol.chapters:
-                        bookch = epub.EpubHtml(
+                        bookch = self.chapter_html(
                             title=ch.title,
                             file_name=f"Text/{ch.filename}",
-                            content=ch.content,
+                            content=self.package_images(ch.content, entries),
                         )
                         ebook.add_item(bookch)
                         ebook.spine.append(bookch)
@@ -391,12 +975,12 @@ class Book:
 
                     ebook.toc.append([bookvol, bookchs])
 
-            for key, image in self.images.items():
-                bookimg = epub.EpubImage(
-                    uid=f"x{image.filehash}",
-                    file_name=f"Images/{image.filename}",
+            for entry, image in entries.items():
+                bookimg = epub.EpubImageFile(
+                    uid=f"x{entry}",
+                    file_name=f"Images/{entry}",
                     media_type=image.mimetype,
-                    content=image.content,
+                    path=image.path,
                 )
                 ebook.add_item(bookimg)
 
@@ -405,18 +989,84 @@ class Book:
         except Exception as e:
             print(e)
         finally:
-            path = self.clean_title_to_path(self.title)
+            epub_file = self.output_file("epub")
 
-            epub_file_path = os.path.join(BASE_DIR, path)
+            epub.write_epub(f"{epub_file}", ebook, {})
 
-            if not os.path.exists(BASE_DIR):
-                os.mkdir(BASE_DIR)
-            if not os.path.exists(epub_file_path):
-                os.mkdir(epub_file_path)
+    async def save_as_epub_streaming(self):
+        """
+        Download the chapters and write each one into the EPUB zip in book order as soon
+        as the contiguous prefix is ready, dropping its content right after.
+        content.opf, toc.ncx and nav.xhtml are written last from the collected metadata.
+        """
+        ebook = epub.EpubBook()
+        ebook.set_identifier(self.uid)
+        ebook.set_title(self.title)
+        ebook.set_language(self.language)
+        ebook.add_metadata("DC", "description", self.description)
 
-            epub_file = os.path.join(epub_file_path, f"{path}.epub")
+        ebook.spine.append("nav")
 
-            epub.write_epub(f"{epub_file}", ebook, {})
+        ebook.toc = []
+
+        writer = epub.EpubStreamWriter(self.output_file("epub"), ebook, {})
+        writer.open()
+        try:
+            entries = {}
+            bookchs = []
+            last_vol_i = None
+
+            async for vol_i, ch_i, ch in self.iter_ordered():
+                if vol_i != last_vol_i:
+                    vol = self.volumes[vol_i]
+                    bookvol = epub.EpubHtml(
+                        title=vol.title,
+                        file_name=f"Text/{vol.filename}",
+                        content=vol.content,
+                    )
+                    await asyncio.to_thread(writer.add_item, bookvol)
+                    ebook.spine.append(bookvol)
+
+                    bookchs = []
+                    ebook.toc.append([bookvol, bookchs])
+                    last_vol_i = vol_i
+
+                # the chapter is final once its images are, the others keep downloading
+                await self.images.wait(image_filenames(ch.content))
+                bookch = self.chapter_html(
+                    title=ch.title,
+                    file_name=f"Text/{ch.filename}",
+                    content=self.package_images(ch.content, entries),
+                )
+                # compress in a thread while the loop keeps downloading
+                await asyncio.to_thread(writer.add_item, bookch)
+                ebook.spine.append(bookch)
+                bookchs.append(bookch)
+
+                ch.content = ""
+
+            await self.images.drain()
+
+            # downloaded alongside the chapters
+            await self.wait_cover()
+            if self.cover:
+                writer.set_cover(
+                    file_name=f"Images/{self.cover.filename}", content=self.cover.read()
+                )
+
+            for entry, image in entries.items():
+                bookimg = epub.EpubImageFile(
+                    uid=f"x{entry}",
+                    file_name=f"Images/{entry}",
+                    media_type=image.mimetype,
+                    path=image.path,
+                )
+                writer.add_item(bookimg)
+
+            writer.add_item(epub.EpubNcx())
+            writer.add_item(epub.EpubNav())
+        finally:
+            writer.close()
 
     def save(self):
         """
@@ -424,7 +1074,20 @@ class Book:
         If the file format is EPUB (1), it calls the 'save_as_epub' method.
         If the file format is TXT (2), it calls the 'save_as_text' method.
         """
-        if self.file_format == FileFormat.EPUB:
+        if self.streaming:
+            if self.file_format == FileFormat.EPUB:
+                self.run(self.save_as_epub_streaming())
+            else:
+                self.run(self.save_as_text_streaming())
+        elif self.file_format == FileFormat.EPUB:
             self.save_as_epub()
         else:
             self.save_as_text()
+
+        if self.manifest is not None:
+            self.manifest.save([ch.id for vol_i, ch_i, ch in self.chapter_jobs()])
+
+        # the book is complete, nothing left to resume
+        if self.journal is not None:
+            self.journal.remove()
+            self.journal = None
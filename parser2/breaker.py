@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+
+
+DEFAULT_FAILURE_THRESHOLD = 0.5
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_REQUESTS = 10
+DEFAULT_OPEN_TIMEOUT = 30.0
+
+
+class BreakerState(Enum):
+    CLOSED = 1
+    OPEN = 2
+    HALF_OPEN = 3
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str):
+        super().__init__(f"circuit open - host: {host}")
+        self.host = host
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host once too many of the recent ones failed.
+
+    The breaker opens when at least `failure_threshold` of the last `window` requests
+    failed. While open, callers are parked (or fail fast with CircuitOpenError when
+    park=False). After `open_timeout` a single probe request is let through: success
+    closes the breaker and releases every parked caller, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: float = DEFAULT_FAILURE_THRESHOLD,
+        window: int = DEFAULT_WINDOW,
+        min_requests: int = DEFAULT_MIN_REQUESTS,
+        open_timeout: float = DEFAULT_OPEN_TIMEOUT,
+        park: bool = True,
+    ):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.open_timeout = open_timeout
+        self.park = park
+        self.state = BreakerState.CLOSED
+        self.opened = 0
+
+        self._results = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        """
+        Wait until a request to the host may be sent.
+        """
+        async with self._cond:
+            while True:
+                timeout = None
+
+                if self.state == BreakerState.CLOSED:
+                    return
+
+                if self.state == BreakerState.OPEN:
+                    timeout = self._opened_at + self.open_timeout - time.monotonic()
+                    if timeout <= 0:
+                        # this caller is the probe
+                        self.state = BreakerState.HALF_OPEN
+                        print(f"[INF] CircuitBreaker - half-open - host: {self.host}")
+                        return
+
+                if not self.park:
+                    raise CircuitOpenError(self.host)
+
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def record(self, success: bool):
+        async with self._cond:
+            if self.state == BreakerState.HALF_OPEN:
+                if success:
+                    self._close()
+                else:
+                    self._open()
+                return
+
+            if self.state == BreakerState.OPEN:
+                return
+
+            self._results.append(success)
+            failures = self._results.count(False)
+            if (
+                len(self._results) >= self.min_requests
+                and failures / len(self._results) >= self.failure_threshold
+            ):
+                self._open()
+
+    def _open(self):
+        self.state = BreakerState.OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        print(f"[ERR] CircuitBreaker - open - host: {self.host}")
+        self._cond.notify_all()
+
+    def _close(self):
+        self.state = BreakerState.CLOSED
+        self._results.clear()
+        print(f"[INF] CircuitBreaker - closed - host: {self.host}")
+        self._cond.notify_all()
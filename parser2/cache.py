@@ -0,0 +1,133 @@
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+
+import httpx
+
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# only what is needed to parse the page again and to revalidate it
+STORED_HEADERS = ("content-type", "etag", "last-modified")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidated: int = 0
+    evicted: int = 0
+
+    def __str__(self):
+        return (
+            f"hits: {self.hits}, misses: {self.misses}, "
+            f"revalidated: {self.revalidated}, evicted: {self.evicted}"
+        )
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    headers: dict
+    content: bytes
+
+    @property
+    def validators(self) -> dict:
+        """
+        Headers for a conditional GET of this entry.
+        """
+        validators = {}
+        if "etag" in self.headers:
+            validators["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["last-modified"]
+        return validators
+
+    def to_response(self) -> httpx.Response:
+        return httpx.Response(
+            httpx.codes.OK,
+            headers=self.headers,
+            content=self.content,
+            request=httpx.Request("GET", self.url),
+        )
+
+
+class HttpCache:
+    """
+    Persistent page cache keyed by URL, stored in a single SQLite file.
+    Least recently used pages are evicted once the total size exceeds max_size.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                headers TEXT NOT NULL,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url: str) -> CacheEntry:
+        row = self.db.execute(
+            "SELECT headers, content FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+
+        if row is None:
+            self.stats.misses += 1
+            return None
+
+        self.db.execute("UPDATE pages SET accessed = ? WHERE url = ?", (time.time(), url))
+        self.db.commit()
+        return CacheEntry(url, json.loads(row[0]), row[1])
+
+    def put(self, url: str, response: httpx.Response, content: bytes = None):
+        """
+        Store the page. content is given when the response body was streamed elsewhere.
+        """
+        headers = {
+            name: response.headers[name]
+            for name in STORED_HEADERS
+            if name in response.headers
+        }
+        if content is None:
+            content = response.content
+
+        old = self.db.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+        if old:
+            self.size -= old[0]
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+            (url, json.dumps(headers), content, len(content), time.time()),
+        )
+        self.size += len(content)
+        self.evict()
+        self.db.commit()
+
+    def evict(self):
+        while self.size > self.max_size:
+            row = self.db.execute(
+                "SELECT url, size FROM pages ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+
+            self.db.execute("DELETE FROM pages WHERE url = ?", (row[0],))
+            self.size -= row[1]
+            self.stats.evicted += 1
+
+    def close(self):
+        self.db.close()
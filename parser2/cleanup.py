@@ -0,0 +1,61 @@
+from parser2.styles import clean_style
+
+
+def clean_style_attribute(el):
+    style = el.get("style")
+    if style is None:
+        return
+
+    style = clean_style(style)
+    if style:
+        el.set("style", style)
+    else:
+        del el.attrib["style"]
+
+
+def remove_element(el):
+    """
+    Remove an element from its parent, keeping the text that follows it.
+    """
+    parent = el.getparent()
+    if el.tail:
+        previous = el.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + el.tail
+        else:
+            parent.text = (parent.text or "") + el.tail
+    parent.remove(el)
+
+
+def clean_content(root, on_image=None):
+    """
+    Clean a chapter's content in a single walk of its tree: inline styles are
+    cleaned (dropped once empty) and empty paragraphs are removed.
+
+    on_image(img) is called for every <img>, it may change or remove the element;
+    the style it leaves is cleaned as well. Images and paragraphs are handled once
+    the walk is over, so the tree is not changed under the iterator, and a paragraph
+    left empty by a removed image goes too.
+    """
+    images = []
+    paragraphs = []
+
+    for el in root.iter():
+        clean_style_attribute(el)
+
+        if el.tag == "p":
+            # an empty text is None or "", whitespace counts as content
+            if not el.text:
+                paragraphs.append(el)
+        elif el.tag == "img" and on_image is not None:
+            images.append(el)
+
+    for img in images:
+        on_image(img)
+        if img.getparent() is not None:
+            clean_style_attribute(img)
+
+    for p in paragraphs:
+        parent = p.getparent()
+        if len(p) == 0 and parent is not None:
+            parent.remove(p)
@@ -0,0 +1,228 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from parser2.breaker import CircuitBreaker
+from parser2.cache import CacheEntry, HttpCache
+from parser2.limiter import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MIN_CONCURRENCY,
+    AdaptiveLimiter,
+)
+
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_CONNECTIONS = 16
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 16
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_MAX_PER_HOST = 32
+
+
+@dataclass
+class ClientStats:
+    requests: int = 0
+    connections: int = 0
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+    def __str__(self):
+        return (
+            f"requests: {self.requests}, new connections: {self.connections}, "
+            f"reused: {self.reused}"
+        )
+
+
+class SharedClient:
+    """
+    One long-lived, connection-pooled httpx client shared by every task of a Book.
+    Connections are kept alive between requests and multiplexed over HTTP/2,
+    so a whole book costs a handful of TCP+TLS handshakes instead of one per request.
+
+    In-flight requests are bounded by an adaptive limiter and by one semaphore per host,
+    so any number of chapter and image tasks can wait on a single event loop.
+    Each host also has a circuit breaker, which parks its requests while it is failing.
+    """
+
+    def __init__(
+        self,
+        cookies: dict = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        http2: bool = True,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        min_concurrency: int = DEFAULT_MIN_CONCURRENCY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        cache: HttpCache = None,
+        breaker_options: dict = None,
+    ):
+        self.stats = ClientStats()
+        self.cache = cache
+        self.max_per_host = max_per_host
+        self.limiter = AdaptiveLimiter(min_concurrency, max_concurrency)
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+        self.breaker_options = breaker_options or {}
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=http2,
+            cookies=cookies,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_semaphores[host]
+
+    def _breaker(self, url: str) -> CircuitBreaker:
+        host = httpx.URL(url).host
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host, **self.breaker_options)
+        return self.breakers[host]
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore only opens a TCP connection when none in the pool can be reused
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections += 1
+
+    async def get(
+        self,
+        url: str,
+        cache: bool = False,
+        revalidate: bool = False,
+        sink=None,
+        on_send=None,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        GET url. With cache=True the page is answered from the on-disk cache when present,
+        or revalidated with a conditional GET first when revalidate=True.
+
+        With a sink, e.g. a SpoolFile, a 200 body is streamed into it instead of being
+        read into the response: sink.reset(encoding) is called first, then
+        sink.write(chunk) for every chunk until it returns False. A cached body is
+        written to the sink in one go.
+
+        on_send() is called once the request has its turn and is about to be sent,
+        after waiting on the breaker, the host semaphore and the limiter.
+
+        A URL that is not http(s), e.g. data: or a relative one, raises
+        httpx.UnsupportedProtocol before anything is sent: it says nothing about the
+        host, so neither the limiter nor the breaker hear of it.
+        """
+        if httpx.URL(url).scheme not in ("http", "https"):
+            raise httpx.UnsupportedProtocol(f"Request URL is not http(s): {url!r}")
+
+        entry = None
+        keep = cache and self.cache is not None
+
+        if keep:
+            entry = self.cache.get(url)
+            if entry is not None:
+                if not revalidate:
+                    self.cache.stats.hits += 1
+                    return self._replay(entry, sink)
+                kwargs["headers"] = entry.validators
+
+        breaker = self._breaker(url)
+        await breaker.acquire()
+
+        async with self._host_semaphore(url):
+            await self.limiter.acquire()
+            if on_send is not None:
+                on_send()
+            self.stats.requests += 1
+            start = time.monotonic()
+            headers_at = None
+            status = None
+            body = None
+
+            async def trace(event_name: str, info: dict):
+                nonlocal headers_at
+                await self._trace(event_name, info)
+                if event_name.endswith(".receive_response_headers.complete"):
+                    headers_at = time.monotonic()
+
+            try:
+                if sink is None:
+                    response = await self.client.get(
+                        url, extensions={"trace": trace}, **kwargs
+                    )
+                else:
+                    response, body = await self._stream(
+                        url, sink, keep, trace, **kwargs
+                    )
+                status = response.status_code
+            finally:
+                # latency to the response headers: a multi-MB image or index body
+                # says more about its size than about how loaded the server is
+                latency = (headers_at or time.monotonic()) - start
+                await self.limiter.release(latency, status)
+                # 4xx is about the page, not about the health of the host
+                await breaker.record(
+                    status is not None
+                    and status != httpx.codes.TOO_MANY_REQUESTS
+                    and status < httpx.codes.INTERNAL_SERVER_ERROR
+                )
+
+        if entry is not None:
+            if response.status_code == httpx.codes.NOT_MODIFIED:
+                self.cache.stats.hits += 1
+                self.cache.stats.revalidated += 1
+                return self._replay(entry, sink)
+            self.cache.stats.misses += 1
+
+        if keep and response.status_code == httpx.codes.OK:
+            if sink is None:
+                self.cache.put(url, response)
+            elif body is not None:
+                self.cache.put(url, response, body)
+
+        return response
+
+    def _replay(self, entry: CacheEntry, sink) -> httpx.Response:
+        response = entry.to_response()
+        if sink is not None:
+            sink.reset(response.charset_encoding)
+            sink.write(entry.content)
+        return response
+
+    async def _stream(self, url: str, sink, keep: bool, trace, **kwargs):
+        """
+        Stream the body into sink. Returns the response and, with keep=True, the body
+        to be cached, or None when the sink stopped the transfer early.
+        """
+        chunks = []
+        async with self.client.stream(
+            "GET", url, extensions={"trace": trace}, **kwargs
+        ) as response:
+            if response.status_code != httpx.codes.OK:
+                await response.aread()
+                return response, None
+
+            sink.reset(response.charset_encoding)
+            # chunks as they arrive, a chunk size would hold them back until it is full
+            async for chunk in response.aiter_bytes():
+                if not sink.write(chunk):
+                    # leaving the block closes the stream, the rest is never sent
+                    return response, None
+                if keep:
+                    chunks.append(chunk)
+
+        return response, b"".join(chunks) if keep else None
+
+    async def aclose(self):
+        await self.client.aclose()
+        if self.cache is not None:
+            self.cache.close()
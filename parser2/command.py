@@ -14,27 +14,42 @@ class Command(ABC):
 
 
 class BookCommand(Command):
-    def __init__(self, receiver, book_url, file_format) -> None:
+    def __init__(self, receiver, book_url, file_format, **options) -> None:
         self.receiver = receiver
         self.book_url = book_url
         self.file_format = file_format
+        self.options = options
 
     def process(self):
-        self.receiver.save_action(self.book_url, self.file_format)
+        self.receiver.save_action(self.book_url, self.file_format, **self.options)
 
 
 class Receiver:
-    def save_action(self, book_url, file_format):
+    def save_action(self, book_url, file_format, **options):
+        """
+        Download the book and save it. options are passed on to Book.
+        """
         if int(file_format) == 1:
             file_format = FileFormat.EPUB
         else:
             file_format = FileFormat.TXT
 
-        book = Book(book_url, file_format)
-        book.parse()
-        book.parse_chapters()
-        book.print_content()
-        book.save()
+        book = Book(book_url, file_format, **options)
+        try:
+            book.parse()
+            if book.streaming:
+                # chapters are downloaded while the file is written
+                book.save()
+                book.print_content()
+            else:
+                book.parse_chapters()
+                book.print_content()
+                book.save()
+        finally:
+            book.close()
+
+        if book.client.cache is not None:
+            print(f"[INF] Receiver.save_action - cache - {book.client.cache.stats}")
         print("Success!")
 
 
@@ -0,0 +1,190 @@
+import re
+from enum import Enum
+from functools import lru_cache
+
+import httpx
+from bs4 import BeautifulSoup
+from lxml import etree
+
+
+# comments, scripts and styles may hold tags that are not part of the page
+SKIP_START_RE = rb"<(?P<skip>!--|script\b|style\b)"
+SKIP_END_RES = {
+    b"!--": re.compile(rb"-->"),
+    b"script": re.compile(rb"</script\b", re.IGNORECASE),
+    b"style": re.compile(rb"</style\b", re.IGNORECASE),
+}
+CONTENT_START_RE = re.compile(
+    rb"<div\b[^>]*?\bclass\s*=\s*[\"']content-text[\"']|" + SKIP_START_RE,
+    re.IGNORECASE,
+)
+DIV_TAG_RE = re.compile(rb"<(?P<close>/?)div\b|" + SKIP_START_RE, re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb"<meta\b[^>]*?charset\s*=\s*[\"']?([\w-]+)", re.IGNORECASE)
+# longest tag worth keeping across chunks while looking for the content div
+MAX_TAG_SIZE = 4096
+# longest start of a <div>, </div> or <script tag, and of a </script tag
+DIV_TAG_SIZE = len(b"<script")
+SKIP_END_SIZE = len(b"</script")
+
+class ParseMode(Enum):
+    LXML = 1
+    SOUP = 2
+
+
+@lru_cache(maxsize=None)
+def get_parser(encoding: str = None) -> etree.HTMLParser:
+    # parsers are reusable, one per encoding is enough
+    return etree.HTMLParser(encoding=encoding)
+
+
+def parse_html(content: bytes, encoding: str = None, mode: ParseMode = ParseMode.LXML):
+    """
+    Parse a raw HTML page into an lxml tree.
+
+    ParseMode.LXML feeds the bytes straight into lxml's HTML parser. When no encoding
+    is given, libxml2 detects it from the document itself (BOM, <meta charset>).
+    ParseMode.SOUP is the old BeautifulSoup -> str -> etree round-trip.
+    """
+    if mode == ParseMode.SOUP:
+        soup = BeautifulSoup(content, "html.parser")
+        return etree.HTML(str(soup))
+
+    return etree.fromstring(content, get_parser(encoding))
+
+
+def parse_content(content: bytes, encoding: str = None):
+    """
+    Parse the bytes of a content div cut out of a page, an empty document when
+    there are none.
+    """
+    if not content:
+        return etree.Element("html")
+    return etree.fromstring(content, get_parser(encoding))
+
+
+def parse_response(response: httpx.Response, mode: ParseMode = ParseMode.LXML):
+    """
+    Parse the body of a response, using the charset from its Content-Type header.
+    """
+    return parse_html(response.content, response.charset_encoding, mode)
+
+
+class ContentFeed:
+    """
+    Download sink that keeps only the bytes of the content-text div and parses just
+    those, instead of building a tree of the whole page (navigation, scripts, comments).
+
+    The div is found with a byte scan: its start tag by class, its end by counting
+    <div> and </div> tags from there. Comments, scripts and styles are skipped, as
+    the tags in them are not part of the page. close() returns the root of a small document
+    holding only that div, which is empty when the page has none.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, encoding: str = None):
+        self.encoding = encoding
+        self.buffer = bytearray()
+        self.found = False
+        self.done = False
+        self.depth = 0
+        self.pos = 0
+        self.skip_end = None
+
+    def write(self, chunk: bytes) -> bool:
+        if self.done:
+            # the rest of the page is not needed, but is still read for the cache
+            return True
+
+        self.buffer += chunk
+        if not self.found:
+            self._find_start()
+        if self.found:
+            self._find_end()
+        return True
+
+    def _next_tag(self, tag_re: re.Pattern, tag_size: int):
+        """
+        The next match of tag_re from self.pos outside comments, scripts and styles,
+        or None when more bytes are needed. self.pos is then where to scan again.
+        """
+        while True:
+            if self.skip_end is not None:
+                end = self.skip_end.search(self.buffer, self.pos)
+                if end is None:
+                    # the end of the span may be cut by the chunk boundary
+                    self.pos = max(self.pos, len(self.buffer) - SKIP_END_SIZE)
+                    return None
+                self.pos = end.end()
+                self.skip_end = None
+
+            m = tag_re.search(self.buffer, self.pos)
+            if m is None:
+                # a tag cut by the chunk boundary is matched again next time
+                self.pos = max(self.pos, len(self.buffer) - tag_size)
+                return None
+            if m.end() == len(self.buffer):
+                # <div at the end of the chunk may go on as <divider
+                self.pos = m.start()
+                return None
+
+            skip = m.group("skip")
+            if skip is None:
+                return m
+            self.skip_end = SKIP_END_RES[skip.lower()]
+            self.pos = m.end()
+
+    def _find_start(self):
+        m = self._next_tag(CONTENT_START_RE, MAX_TAG_SIZE)
+
+        if self.encoding is None:
+            # the slice loses <meta charset>, take it from the head of the page
+            end = m.start() if m else len(self.buffer)
+            meta = META_CHARSET_RE.search(self.buffer, 0, end)
+            # a charset cut by the chunk boundary is matched again next time
+            if meta and meta.end() < len(self.buffer):
+                self.encoding = meta.group(1).decode("ascii")
+
+        if m is None:
+            del self.buffer[: self.pos]
+            self.pos = 0
+            return
+
+        del self.buffer[: m.start()]
+        self.pos = 0
+        self.found = True
+
+    def _find_end(self):
+        while True:
+            m = self._next_tag(DIV_TAG_RE, DIV_TAG_SIZE)
+            if m is None:
+                return
+            self.depth += -1 if m.group("close") else 1
+            if self.depth == 0:
+                break
+            self.pos = m.end()
+
+        end = self.buffer.find(b">", m.end())
+        if end == -1:
+            # the end tag is cut by the chunk boundary, count it again next time
+            self.depth += 1
+            self.pos = m.start()
+            return
+
+        del self.buffer[end + 1 :]
+        self.done = True
+
+    def content(self) -> bytes:
+        """
+        The bytes of the content div, empty when the page has none.
+        """
+        if not self.found:
+            return b""
+        return bytes(self.buffer)
+
+    def close(self):
+        """
+        Parse the content div, returning the root of the document holding it.
+        """
+        return parse_content(self.content(), self.encoding)
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from enum import Enum
+
+import httpx
+import xxhash
+
+from parser2 import mimetype
+
+
+DEFAULT_IMAGE_CONCURRENCY = 8
+
+class ImageTooLarge(Exception):
+    """
+    Raised by a fetch when the image grows past the max_size it was given.
+    """
+
+
+class ImageMode(Enum):
+    OFF = 1
+    COVER = 2
+    ALL = 3
+
+
+@dataclass
+class ImageBudget:
+    """
+    Limits on the chapter images of one book, None means unlimited.
+    An image over max_image_bytes, or over what is left of max_bytes, is aborted
+    mid-transfer. Once max_count or max_bytes is reached, the remaining images are
+    skipped without being fetched.
+    """
+
+    max_bytes: int = None
+    max_image_bytes: int = None
+    max_count: int = None
+    used_bytes: int = 0
+    used_count: int = 0
+    exhausted: bool = False
+
+    def reserve(self) -> bool:
+        """
+        Take one image out of the budget before fetching it.
+        """
+        if self.exhausted:
+            return False
+        if self.max_count is not None and self.used_count >= self.max_count:
+            self.exhausted = True
+            return False
+
+        self.used_count += 1
+        return True
+
+    def size_limit(self) -> int:
+        """
+        Largest image that may still be fetched, None when unlimited.
+        0 once max_bytes is used up, which exhausts the budget.
+        """
+        limit = self.max_image_bytes
+        if self.max_bytes is not None:
+            left = max(self.max_bytes - self.used_bytes, 0)
+            if left == 0:
+                self.exhausted = True
+            limit = left if limit is None else min(limit, left)
+        return limit
+
+    def charge(self, size: int) -> bool:
+        """
+        Account for a downloaded image. False if it does not fit any more.
+        """
+        if self.max_bytes is not None and self.used_bytes + size > self.max_bytes:
+            self.exhausted = True
+            return False
+
+        self.used_bytes += size
+        return True
+
+
+@dataclass
+class Image:
+    filehash: str
+    filename: str
+    # the content stays on disk, in the spool or in a journal/manifest
+    path: str
+    mimetype: str
+    size: int = 0
+    # owned by the spool, may be deleted once another copy is known
+    spooled: bool = False
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+@dataclass
+class ImageStats:
+    requested: int = 0
+    fetched: int = 0
+    failed: int = 0
+    url_hits: int = 0
+    content_dupes: int = 0
+    bytes_saved: int = 0
+    skipped: int = 0
+
+    def __str__(self):
+        return (
+            f"requested: {self.requested}, fetched: {self.fetched}, "
+            f"failed: {self.failed}, over budget: {self.skipped}, "
+            f"same url: {self.url_hits}, "
+            f"same content: {self.content_dupes}, bytes saved: {self.bytes_saved}"
+        )
+
+
+def normalize_url(url: str) -> str:
+    # scheme and host are case-insensitive, the fragment never reaches the server
+    return str(httpx.URL(url).copy_with(fragment=None))
+
+
+def image_filename(url: str) -> str:
+    """
+    File name of an image inside the book, known before it is downloaded.
+    It has no extension, readers go by the media type in the manifest.
+    """
+    return xxhash.xxh3_128_hexdigest(normalize_url(url).encode("utf-8"))
+
+
+class ImageRegistry:
+    """
+    Book-wide image download stage.
+
+    Chapters enqueue image URLs and get the final file name back immediately, so they
+    never wait on image I/O. Each normalized URL is fetched once, by a background task
+    bounded by `concurrency`; images that share content by xxh3_128 hash share one file
+    on disk and one entry in the book (see entry). An image that can not be fetched, or
+    that no longer fits the budget once downloaded, is remembered as failed: find()
+    returns None for it and the writers leave it out of its chapter.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        concurrency: int = DEFAULT_IMAGE_CONCURRENCY,
+        on_image=None,
+        budget: ImageBudget = None,
+    ):
+        # fetch: coroutine function (url, max_size) -> Image or None, max_size is
+        # the most bytes the image may take, None when unlimited. Raises
+        # ImageTooLarge when the image grows past it
+        self.fetch = fetch
+        # on_image: called with every downloaded image, e.g. to checkpoint it
+        self.on_image = on_image
+        self.budget = budget or ImageBudget()
+        self.stats = ImageStats()
+
+        self._images: dict[str, Image] = {}
+        self._by_hash: dict[str, Image] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._failed: set[str] = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def enqueue(self, url: str) -> str:
+        """
+        Schedule the download of url, returning its file name.
+        None when the budget is spent and the image should be left out.
+        """
+        filename = image_filename(url)
+        self.stats.requested += 1
+
+        with self._lock:
+            known = (
+                filename in self._images
+                or filename in self._tasks
+                or filename in self._failed
+            )
+        if known:
+            self.stats.url_hits += 1
+            return filename
+
+        if not self.budget.reserve():
+            self.stats.skipped += 1
+            return None
+
+        self._tasks[filename] = asyncio.ensure_future(self._download(url, filename))
+        return filename
+
+    async def _download(self, url: str, filename: str):
+        async with self._semaphore:
+            # the budget may have run out while this image waited for its turn
+            max_size = self.budget.size_limit()
+            if self.budget.exhausted:
+                self._skip(filename)
+                return
+
+            try:
+                image = await self.fetch(url, max_size)
+            except ImageTooLarge:
+                if max_size == self.budget.max_image_bytes:
+                    image = None
+                else:
+                    # it does not fit what is left of max_bytes, nor will the rest
+                    self.budget.exhausted = True
+                    self._skip(filename)
+                    return
+
+        if image and not self.budget.charge(image.size):
+            self.stats.skipped += 1
+            if image.spooled:
+                os.remove(image.path)
+            image = None
+        elif image:
+            self.stats.fetched += 1
+            image.filename = filename
+            if self.on_image is not None:
+                self.on_image(image)
+        else:
+            self.stats.failed += 1
+
+        if image is None:
+            with self._lock:
+                self._failed.add(filename)
+            return
+
+        self.add(image)
+
+    def _skip(self, filename: str):
+        self.stats.skipped += 1
+        with self._lock:
+            self._failed.add(filename)
+
+    async def wait(self, filenames):
+        """
+        Wait until the images with the given file names are downloaded.
+        """
+        tasks = [self._tasks[f] for f in filenames if f in self._tasks]
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def drain(self):
+        """
+        Wait until every enqueued image is downloaded.
+        """
+        while self._tasks:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            await asyncio.gather(*tasks)
+
+    def add(self, image: Image) -> Image:
+        """
+        Register an image under its file name, sharing the file of a known image
+        with the same content.
+        """
+        with self._lock:
+            known = self._by_hash.get(image.filehash)
+            if known is not None and known.path != image.path:
+                self.stats.content_dupes += 1
+                self.stats.bytes_saved += image.size
+                if image.spooled:
+                    os.remove(image.path)
+                image.path = known.path
+                image.spooled = False
+            else:
+                self._by_hash[image.filehash] = image
+
+            self._images[image.filename] = image
+        return image
+
+    def find(self, filename: str) -> Image:
+        with self._lock:
+            return self._images.get(filename)
+
+    def entry(self, image: Image) -> str:
+        """
+        Name of the book entry holding the image: the first image with the same
+        content keeps it for all of them, with the extension of its format.
+        """
+        with self._lock:
+            kept = self._by_hash.get(image.filehash, image)
+        return f"{kept.filename}{mimetype.get_extension(kept.mimetype)}"
+
+    def values(self) -> list[Image]:
+        with self._lock:
+            return list(self._images.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._images)
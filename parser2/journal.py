@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass
+
+from parser2.spool import copy_file
+
+
+CHAPTERS_FILE = "chapters.jsonl"
+IMAGES_DIR = "images"
+
+
+@dataclass
+class JournalEntry:
+    filename: str
+    title: str
+    content: str
+    binary: bool = False
+
+
+class Journal:
+    """
+    Append-only checkpoint of the chapters completed by an unfinished download.
+    Every chapter is synced to disk as soon as it is appended, so an interrupted run
+    can be resumed and only the missing chapters are downloaded again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict[str, JournalEntry] = {}
+
+        os.makedirs(os.path.join(path, IMAGES_DIR), exist_ok=True)
+
+        chapters_file = os.path.join(path, CHAPTERS_FILE)
+        if os.path.exists(chapters_file):
+            with open(chapters_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = JournalEntry(**json.loads(line))
+                    except (ValueError, TypeError):
+                        # torn last line of a killed run
+                        continue
+                    self.entries[entry.filename] = entry
+
+        self.file = open(chapters_file, "a", encoding="utf-8")
+
+    def get(self, filename: str, title: str) -> JournalEntry:
+        entry = self.entries.get(filename)
+        if entry is None or entry.title != title:
+            return None
+        return entry
+
+    def append(self, filename: str, title: str, content):
+        binary = isinstance(content, bytes)
+        if binary:
+            content = content.decode("utf-8")
+
+        entry = JournalEntry(filename, title, content, binary)
+        self.file.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def image_path(self, filename: str) -> str:
+        return os.path.join(self.path, IMAGES_DIR, filename)
+
+    def find_image(self, filename: str) -> str:
+        path = self.image_path(filename)
+        if not os.path.exists(path):
+            return None
+        return path
+
+    def write_image(self, filename: str, source: str):
+        path = self.image_path(filename)
+        if not os.path.exists(path):
+            copy_file(source, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        """
+        Drop the journal once the book has been saved.
+        """
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import deque
+
+import httpx
+
+
+DEFAULT_MIN_CONCURRENCY = 2
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_INITIAL_CONCURRENCY = 8
+
+# responses that mean the server wants us to slow down
+PUSHBACK_STATUSES = frozenset(
+    {httpx.codes.TOO_MANY_REQUESTS, httpx.codes.SERVICE_UNAVAILABLE}
+)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of in-flight requests.
+
+    The limit grows by about one per round of successful requests while latency stays
+    healthy, and is cut by `decrease` on 429/503, transport errors, or when the p95
+    latency rises above `latency_factor` times the best p95 seen so far. Latency is
+    the time to the response headers, so large bodies do not read as a slow server.
+    Cuts are at most one per `cooldown` seconds, so a burst of failures counts once.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = DEFAULT_MIN_CONCURRENCY,
+        max_limit: int = DEFAULT_MAX_CONCURRENCY,
+        initial_limit: int = DEFAULT_INITIAL_CONCURRENCY,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0,
+        latency_window: int = 100,
+        cooldown: float = 1.0,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+
+        self._latencies = deque(maxlen=latency_window)
+        self._best_p95 = None
+        self._last_cut = 0.0
+        self._cond = asyncio.Condition()
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def p95(self) -> float:
+        if len(self._latencies) < self._latencies.maxlen:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.current)
+            self.in_flight += 1
+
+    async def release(self, latency: float, status: int = None):
+        """
+        Give the slot back. status is None when the request failed without a response.
+        """
+        if status is None or status in PUSHBACK_STATUSES:
+            self._cut()
+        else:
+            self._latencies.append(latency)
+            p95 = self.p95()
+            if p95 is not None:
+                if self._best_p95 is None or p95 < self._best_p95:
+                    self._best_p95 = p95
+
+            if p95 is not None and p95 > self._best_p95 * self.latency_factor:
+                self._cut()
+            else:
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _cut(self):
+        now = time.monotonic()
+        if now - self._last_cut < self.cooldown:
+            return
+
+        self._last_cut = now
+        self.limit = max(self.limit * self.decrease, self.min_limit)
+        # latencies from before the cut describe a busier server
+        self._latencies.clear()
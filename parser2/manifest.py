@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass
+
+import xxhash
+
+
+MANIFEST_FILE = "manifest.json"
+CHAPTERS_DIR = "chapters"
+IMAGES_DIR = "images"
+
+
+@dataclass
+class ManifestEntry:
+    id: str
+    url: str
+    title: str
+    hash: str
+
+
+class Manifest:
+    """
+    Chapter list of the last export, kept next to the output file together with
+    the parsed chapter bodies and images, so an update only downloads what changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict[str, ManifestEntry] = {}
+
+        os.makedirs(os.path.join(path, CHAPTERS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(path, IMAGES_DIR), exist_ok=True)
+
+        manifest_file = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_file):
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self.entries[entry["id"]] = ManifestEntry(**entry)
+
+    def body_path(self, chapter_id: str) -> str:
+        return os.path.join(self.path, CHAPTERS_DIR, chapter_id)
+
+    def image_path(self, filename: str) -> str:
+        return os.path.join(self.path, IMAGES_DIR, filename)
+
+    def is_unchanged(self, chapter_id: str, url: str, title: str) -> bool:
+        entry = self.entries.get(chapter_id)
+        return (
+            entry is not None
+            and entry.url == url
+            and entry.title == title
+            and os.path.exists(self.body_path(chapter_id))
+        )
+
+    def read_body(self, chapter_id: str) -> bytes:
+        with open(self.body_path(chapter_id), "rb") as f:
+            content = f.read()
+
+        if xxhash.xxh3_128_hexdigest(content) != self.entries[chapter_id].hash:
+            return None
+        return content
+
+    def write_body(self, chapter_id: str, url: str, title: str, content: bytes):
+        with open(self.body_path(chapter_id), "wb") as f:
+            f.write(content)
+
+        self.entries[chapter_id] = ManifestEntry(
+            chapter_id, url, title, xxhash.xxh3_128_hexdigest(content)
+        )
+
+    def find_image(self, filename: str) -> str:
+        path = self.image_path(filename)
+        if not os.path.exists(path):
+            return None
+        return path
+
+    def write_image(self, filename: str, source: str):
+        path = self.image_path(filename)
+        if not os.path.exists(path):
+            shutil.copyfile(source, path)
+
+    def save(self, chapter_ids: list[str]):
+        """
+        Write the manifest for the given chapters, forgetting chapters no longer in the book.
+        """
+        entries = [
+            asdict(self.entries[cid]) for cid in chapter_ids if cid in self.entries
+        ]
+
+        manifest_file = os.path.join(self.path, MANIFEST_FILE)
+        with open(f"{manifest_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(f"{manifest_file}.tmp", manifest_file)
@@ -1,20 +1,108 @@
-def get_file_extension(data):
-    ## webp
-    if data[8:12] == b"WEBP":
-        return ".webp", "image/webp"
+import struct
 
-    ## png
-    elif data[0:4] == b"\x89PNG":
-        return ".png", "image/png"
+# binary formats are told by their first 32 bytes; the rest of the window is for
+# SVG, whose root element may follow an XML prolog, comments and a doctype
+SNIFF_SIZE = 512
 
+# (((offset, magic), ...), extension, mimetype), most common formats first
+SIGNATURES = (
+    ## jpg
+    (((0, b"\xFF\xD8\xFF"),), ".jpg", "image/jpeg"),
+    ## png
+    (((0, b"\x89PNG\r\n\x1a\n"),), ".png", "image/png"),
+    ## webp
+    (((0, b"RIFF"), (8, b"WEBP")), ".webp", "image/webp"),
     ## gif
-    elif data[0:4] == b"GIF8":
-        return ".gif", "image/gif"
+    (((0, b"GIF87a"),), ".gif", "image/gif"),
+    (((0, b"GIF89a"),), ".gif", "image/gif"),
+    ## avif
+    (((4, b"ftypavif"),), ".avif", "image/avif"),
+    (((4, b"ftypavis"),), ".avif", "image/avif"),
+    ## jpeg xl, bare codestream and ISOBMFF container
+    (((0, b"\xFF\x0A"),), ".jxl", "image/jxl"),
+    (((0, b"\x00\x00\x00\x0CJXL \r\n\x87\n"),), ".jxl", "image/jxl"),
+)
+
+## bmp: "BM", file size, 4 reserved bytes, pixel data offset, then the size of the
+## DIB header, which is one of a few known values
+BMP = (".bmp", "image/bmp")
+BMP_HEADER = struct.Struct("<2sIHHII")
+BMP_DIB_SIZES = (12, 40, 52, 56, 64, 108, 124)
+
+## svg, text: may start with a BOM and whitespace. The first element must be <svg,
+## in the window, straight away or after an XML prolog, comments and a doctype
+SVG = (".svg", "image/svg+xml")
+SVG_ROOT = b"<svg"
+SVG_SKIPPED = ((b"<?", b"?>"), (b"<!--", b"-->"), (b"<!DOCTYPE", b">"))
+
+
+def is_bmp(data) -> bool:
+    if len(data) < BMP_HEADER.size:
+        return False
+    magic, _, _, _, offset, dib_size = BMP_HEADER.unpack_from(data)
+    return (
+        magic == b"BM"
+        and dib_size in BMP_DIB_SIZES
+        and offset >= BMP_HEADER.size - 4 + dib_size
+    )
 
-    ## jpg
-    elif data[0:3] == b"\xFF\xD8\xFF":
-        return ".jpg", "image/jpeg"
+
+def is_svg(data) -> bool:
+    text = data[:SNIFF_SIZE].removeprefix(b"\xef\xbb\xbf").lstrip()
+    while not text.startswith(SVG_ROOT):
+        for start, end in SVG_SKIPPED:
+            if text.startswith(start):
+                if start == b"<!DOCTYPE":
+                    subset = text.find(b"[")
+                    if subset != -1 and subset < text.find(b">"):
+                        # internal subset, <!ENTITY ...> declarations inside
+                        end = b"]>"
+                pos = text.find(end, len(start))
+                if pos == -1:
+                    return False
+                text = text[pos + len(end) :].lstrip()
+                break
+        else:
+            return False
+    return True
+
+
+def get_file_extension(data):
+    """
+    Tell the image format from the first SNIFF_SIZE bytes of a file.
+    Returns (extension, mimetype), or (None, None) for anything that is not an image.
+    """
+    for magics, ext, mime in SIGNATURES:
+        for offset, magic in magics:
+            if not data.startswith(magic, offset):
+                break
+        else:
+            return ext, mime
+
+    ## bmp
+    if is_bmp(data):
+        return BMP
+
+    ## svg
+    if is_svg(data):
+        return SVG
 
     ## else
-    else:
-        return None
+    return None, None
+
+
+def is_image(data) -> bool:
+    return get_file_extension(data)[0] is not None
+
+
+def get_extension(mime: str) -> str:
+    """
+    Extension for a mimetype returned by get_file_extension, "" when unknown.
+    """
+    for ext, known in (BMP, SVG):
+        if known == mime:
+            return ext
+    for _, ext, known in SIGNATURES:
+        if known == mime:
+            return ext
+    return ""
@@ -0,0 +1,150 @@
+import asyncio
+import io
+import os
+from dataclasses import dataclass
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # optional, without Pillow images are packaged as served
+    PILImage = None
+
+from parser2.pool import process_pool
+
+
+DEFAULT_MAX_DIMENSION = 1600
+DEFAULT_QUALITY = 80
+DEFAULT_FORMAT = "JPEG"
+# PNGs smaller than this are only recompressed losslessly
+DEFAULT_CONVERT_THRESHOLD = 256 * 1024
+
+# what survives re-encoding, EXIF, XMP and text chunks are dropped
+KEPT_INFO = ("transparency", "icc_profile")
+
+
+@dataclass
+class OptimizeOptions:
+    max_dimension: int = DEFAULT_MAX_DIMENSION
+    quality: int = DEFAULT_QUALITY
+    # what oversized PNGs become: JPEG (only without alpha) or WEBP
+    format: str = DEFAULT_FORMAT
+    convert_threshold: int = DEFAULT_CONVERT_THRESHOLD
+    workers: int = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.max_dimension}-{self.quality}-{self.format.lower()}"
+
+
+def has_alpha(img) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (
+        img.mode == "P" and "transparency" in img.info
+    )
+
+
+def optimize_image(source: str, options: OptimizeOptions) -> bytes:
+    """
+    Downscale and recompress the image in the source file. Returns None when the image
+    is better left as it is. Runs in a worker process.
+    """
+    size = os.path.getsize(source)
+    try:
+        with PILImage.open(source) as img:
+            img.load()
+            source_format = img.format
+
+            if getattr(img, "is_animated", False):
+                return None
+
+            resized = max(img.size) > options.max_dimension
+            if resized:
+                img.thumbnail(
+                    (options.max_dimension, options.max_dimension),
+                    PILImage.Resampling.LANCZOS,
+                )
+
+            img.info = {k: v for k, v in img.info.items() if k in KEPT_INFO}
+
+            target = source_format
+            if source_format == "PNG" and size >= options.convert_threshold:
+                if options.format.upper() == "WEBP":
+                    target = "WEBP"
+                elif not has_alpha(img):
+                    target = "JPEG"
+
+            out = io.BytesIO()
+            if target == "JPEG":
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                img.save(
+                    out, "JPEG", quality=options.quality, optimize=True, progressive=True
+                )
+            elif target == "WEBP":
+                img.save(out, "WEBP", quality=options.quality, method=4)
+            elif target == "PNG":
+                img.save(out, "PNG", optimize=True)
+            elif resized:
+                img.save(out, target)
+            else:
+                return None
+    except (OSError, ValueError, PILImage.DecompressionBombError):
+        return None
+
+    result = out.getvalue()
+    if len(result) >= size:
+        return None
+    return result
+
+
+class ImageOptimizer:
+    """
+    Image optimization stage. Images are processed in a process pool, off the event
+    loop, and the results are cached on disk by source hash and options, so an image
+    is never optimized twice.
+    """
+
+    def __init__(self, options: OptimizeOptions, cache_dir: str):
+        self.options = options
+        self.cache_dir = cache_dir
+        self.saved = 0
+        self._pool = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def available() -> bool:
+        return PILImage is not None
+
+    def cache_path(self, filehash: str) -> str:
+        return os.path.join(self.cache_dir, f"{filehash}-{self.options.key}")
+
+    async def optimize(self, filehash: str, source: str) -> str:
+        """
+        Path of the optimized image with the given source hash, or source itself
+        if it can not be made smaller.
+        """
+        path = self.cache_path(filehash)
+        if not os.path.exists(path):
+            if self._pool is None:
+                self._pool = process_pool(self.options.workers)
+
+            loop = asyncio.get_running_loop()
+            optimized = await loop.run_in_executor(
+                self._pool, optimize_image, source, self.options
+            )
+
+            # empty file: the source is already as small as it gets
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(optimized or b"")
+            os.replace(f"{path}.tmp", path)
+
+        size = os.path.getsize(path)
+        if not size:
+            return source
+
+        self.saved += os.path.getsize(source) - size
+        return path
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,15 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(workers: int = None) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers do not inherit the threads of this process.
+    Pools are started mid-run, once asyncio.to_thread workers, the other pool's
+    management thread and the SQLite connection exist, and a child forked from a
+    process with threads may deadlock on a lock one of them held. Workers are
+    forked from a clean forkserver instead, or spawned where there is none.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
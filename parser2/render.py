@@ -0,0 +1,182 @@
+import asyncio
+import re
+
+from lxml import etree
+
+from parser2 import cleanup
+from parser2.document import parse_content
+from parser2.images import image_filename
+from parser2.pool import process_pool
+
+
+CONTENT_XPATH = etree.XPath('//*[@class="content-text"]')
+TEXT_XPATH = etree.XPath('//div[@class="content-text"]//text()')
+URL_RE = re.compile(r"\w+:\/{2}[\d\w-]+(\.[\d\w-]+)*(?:(?:\/[^\s/]*))*")
+
+CENTERED_IMAGE_STYLE = "display:block;margin-left:auto;margin-right:auto;"
+IMAGE_SRC_PREFIX = "../Images/"
+
+
+def image_url(src: str, base_url: str) -> str:
+    if src[0:1] == "/":
+        return base_url + src
+    return src
+
+
+def point_image(img, filename: str):
+    """
+    Point an <img> at the file the image is saved as inside the book.
+    """
+    img.set("src", f"{IMAGE_SRC_PREFIX}{filename}")
+    img.set("alt", f"x{filename}")
+    img.set("style", CENTERED_IMAGE_STYLE)
+
+
+def package_images(content: bytes, resolve) -> bytes:
+    """
+    Point the images of a rendered chapter at their entries in the book.
+    resolve(filename) gives the entry of an image, or None to leave the image out,
+    e.g. when it could not be downloaded.
+    """
+    root = etree.fromstring(content)
+    for img in list(root.iter("img")):
+        src = img.get("src", "")
+        if not src.startswith(IMAGE_SRC_PREFIX):
+            continue
+
+        entry = resolve(src[len(IMAGE_SRC_PREFIX) :])
+        if entry is None:
+            parent = img.getparent()
+            cleanup.remove_element(img)
+            if parent.tag == "p" and len(parent) == 0 and not parent.text:
+                cleanup.remove_element(parent)
+        else:
+            img.set("src", f"{IMAGE_SRC_PREFIX}{entry}")
+
+    return etree.tostring(root, encoding="UTF-8", method="xml", with_tail=False)
+
+
+def build_xhtml(
+    content_text, title: str, pretty_print: bool = True, on_image=None
+) -> bytes:
+    """
+    Clean the content-text div of a chapter and serialize it under the chapter title.
+    """
+    cleanup.clean_content(content_text, on_image)
+
+    xml_body = etree.Element("div")
+    # text, not markup: a title may hold & or <
+    etree.SubElement(xml_body, "h2").text = title
+    xml_body.append(content_text)
+
+    if pretty_print:
+        etree.indent(xml_body, space="\t")
+    return etree.tostring(
+        xml_body,
+        # doctype="<!DOCTYPE html>",
+        encoding="UTF-8",
+        method="xml",
+        pretty_print=pretty_print,
+        with_tail=False,
+        # xml_declaration=True,
+    )
+
+
+def extract_text(root) -> str:
+    """
+    Plain text of the content-text div of a chapter, without links.
+    """
+    return URL_RE.sub("", "".join(TEXT_XPATH(root)))
+
+
+def render_xhtml(
+    content: bytes,
+    encoding: str,
+    title: str,
+    pretty_print: bool = True,
+    images: bool = False,
+    base_url: str = "",
+    dropped: frozenset = frozenset(),
+) -> tuple[bytes, list[str]]:
+    """
+    Parse, clean and serialize the bytes of a chapter's content-text div.
+    Runs in a worker process.
+
+    With images, every <img> is pointed at its file in the book and the image URLs
+    are returned in document order, for the caller to enqueue. Images whose file name
+    is in dropped are left out. Without, images are kept as they are.
+    """
+    urls = []
+
+    def on_image(img):
+        src = img.get("src")
+        if not src:
+            return
+
+        url = image_url(src, base_url)
+        filename = image_filename(url)
+        if filename in dropped:
+            img.getparent().remove(img)
+            return
+
+        urls.append(url)
+        point_image(img, filename)
+
+    content_text = CONTENT_XPATH(parse_content(content, encoding))[0]
+    xhtml = build_xhtml(content_text, title, pretty_print, on_image if images else None)
+    return xhtml, urls
+
+
+def render_text(content: bytes, encoding: str) -> str:
+    """
+    Plain text of the bytes of a chapter's content-text div. Runs in a worker process.
+    """
+    return extract_text(parse_content(content, encoding))
+
+
+class ChapterRenderer:
+    """
+    CPU stage of the chapter pipeline. The bytes of the content-text div, as cut out
+    while downloading, go to a process pool that parses, cleans and serializes them,
+    so the event loop is left to the network and only the result comes back.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers
+        self._pool = None
+
+    async def _run(self, fn, *args):
+        if self._pool is None:
+            self._pool = process_pool(self.workers)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, fn, *args)
+
+    async def xhtml(
+        self,
+        content: bytes,
+        encoding: str,
+        title: str,
+        pretty_print: bool = True,
+        images: bool = False,
+        base_url: str = "",
+        dropped: frozenset = frozenset(),
+    ) -> tuple[bytes, list[str]]:
+        return await self._run(
+            render_xhtml,
+            content,
+            encoding,
+            title,
+            pretty_print,
+            images,
+            base_url,
+            dropped,
+        )
+
+    async def text(self, content: bytes, encoding: str) -> str:
+        return await self._run(render_text, content, encoding)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
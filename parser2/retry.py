@@ -0,0 +1,83 @@
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+
+# statuses worth asking again, everything else is final
+RETRY_STATUSES = frozenset(
+    {
+        httpx.codes.TOO_MANY_REQUESTS,
+        httpx.codes.INTERNAL_SERVER_ERROR,
+        httpx.codes.BAD_GATEWAY,
+        httpx.codes.SERVICE_UNAVAILABLE,
+        httpx.codes.GATEWAY_TIMEOUT,
+    }
+)
+
+
+# transport errors worth asking again. The others, e.g. UnsupportedProtocol for a
+# data: URL, fail the same way every time
+RETRY_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+@dataclass
+class RetryStats:
+    retries: int = 0
+    backoff: float = 0.0
+    transport_errors: int = 0
+    gave_up: int = 0
+
+    def __str__(self):
+        return (
+            f"retries: {self.retries}, backoff: {self.backoff:.1f}s, "
+            f"transport errors: {self.transport_errors}, gave up: {self.gave_up}"
+        )
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Decides whether a failed request is retried and how long to wait before it.
+    Only 429, 5xx, timeouts and network errors are retried, with exponential backoff
+    and full jitter, honoring Retry-After. No attempt starts after `deadline` seconds
+    from when the first one was sent.
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    deadline: float = 60.0
+    retry_statuses: frozenset = RETRY_STATUSES
+    retry_errors: tuple = RETRY_ERRORS
+    stats: RetryStats = field(default_factory=RetryStats)
+
+    def should_retry(
+        self, response: httpx.Response = None, error: Exception = None
+    ) -> bool:
+        # no response means the request failed with error
+        if response is None:
+            return isinstance(error, self.retry_errors)
+        return response.status_code in self.retry_statuses
+
+    def retry_after(self, response: httpx.Response) -> float:
+        value = response.headers.get("retry-after") if response is not None else None
+        if not value:
+            return None
+
+        if value.isdigit():
+            return float(value)
+
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def delay(self, attempt: int, response: httpx.Response = None) -> float:
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return retry_after
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
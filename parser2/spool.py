@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+
+import xxhash
+
+from parser2.mimetype import SNIFF_SIZE
+
+
+CHUNK_SIZE = 64 * 1024
+# enough bytes to tell the image format
+HEAD_SIZE = SNIFF_SIZE
+
+# SpoolFile.rejected reasons
+UNSUPPORTED = "unsupported content"
+TOO_LARGE = "too large"
+
+
+class SpoolFile:
+    """
+    Response body written to disk chunk by chunk, hashed with xxh3_128 on the way,
+    so it never has to be held in memory whole.
+
+    accept is called with the first HEAD_SIZE bytes; when it returns False, or when the
+    body grows past max_size, it is rejected and the transfer should be aborted.
+    """
+
+    def __init__(self, path: str, accept=None, max_size: int = None):
+        self.path = path
+        self.accept = accept
+        self.max_size = max_size
+        self.file = open(path, "wb")
+        self.reset()
+
+    def reset(self, encoding: str = None):
+        """
+        Start over, e.g. when the download is retried. The encoding is not used,
+        bodies are kept as they are.
+        """
+        self.file.seek(0)
+        self.file.truncate()
+        self.hasher = xxhash.xxh3_128()
+        self.head = b""
+        self.size = 0
+        # why the body was rejected, None while it is accepted
+        self.rejected: str = None
+
+    def write(self, chunk: bytes) -> bool:
+        """
+        Append a chunk. False once the body has been rejected, nothing more is written.
+        """
+        if self.rejected:
+            return False
+
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[: HEAD_SIZE - len(self.head)]
+            if len(self.head) == HEAD_SIZE and self.accept is not None:
+                if not self.accept(self.head):
+                    self.rejected = UNSUPPORTED
+
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            self.rejected = TOO_LARGE
+        if self.rejected:
+            return False
+
+        self.file.write(chunk)
+        self.hasher.update(chunk)
+        return True
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        self.close()
+        os.remove(self.path)
+
+
+class ImageSpool:
+    """
+    Temporary directory holding the image bodies of a book until it is saved.
+    """
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix="parser2-images-")
+        self._count = 0
+
+    def create(self, accept=None, max_size: int = None) -> SpoolFile:
+        self._count += 1
+        return SpoolFile(os.path.join(self.path, str(self._count)), accept, max_size)
+
+    def write(self, content: bytes) -> SpoolFile:
+        spool = self.create()
+        spool.write(content)
+        spool.close()
+        return spool
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def read_head(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(HEAD_SIZE)
+
+
+def hash_file(path: str) -> str:
+    hasher = xxhash.xxh3_128()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def copy_file(source: str, path: str):
+    """
+    Copy source to path and sync it to disk.
+    """
+    with open(source, "rb") as src, open(path, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        dst.flush()
+        os.fsync(dst.fileno())
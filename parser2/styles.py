@@ -0,0 +1,49 @@
+import re
+from functools import lru_cache
+
+
+# property -> pattern its value must match to be dropped
+STYLE_BLACKLIST = {
+    "margin-left": re.compile(R"0cm"),
+    "margin-right": re.compile(R"0cm"),
+    "text-indent": re.compile(R"[\d\.]*p[xt]"),
+    "font-size": re.compile(R"[\d\.]*p[xt]"),
+    "font-family": re.compile(R".*"),
+    "line-height": re.compile(R"[\d\.]*%"),
+    "color": re.compile(R".*"),
+    "background-color": re.compile(R".*"),
+}
+
+# Word leftovers, e.g. mso-bidi-font-size or mso-fareast-font-family
+MSO_PREFIX = "mso-"
+
+
+def is_blacklisted(prop: str, value: str) -> bool:
+    if prop.startswith(MSO_PREFIX):
+        return True
+
+    pattern = STYLE_BLACKLIST.get(prop)
+    return pattern is not None and pattern.fullmatch(value) is not None
+
+
+@lru_cache(maxsize=4096)
+def clean_style(style: str) -> str:
+    """
+    Drop blacklisted declarations from an inline style in one pass over its declaration list.
+    Identical style strings repeat a lot within a book, so results are memoized.
+    """
+    declarations = []
+
+    for declaration in style.split(";"):
+        prop, sep, value = declaration.partition(":")
+        prop = prop.strip().lower()
+        value = value.strip()
+
+        if not sep or not prop:
+            continue
+
+        if not is_blacklisted(prop, value):
+            declarations.append(f"{prop}: {value}")
+
+    return "; ".join(declarations)
+
@@ -0,0 +1,137 @@
+import re
+from dataclasses import dataclass
+
+from lxml import etree
+
+
+TITLE_XPATH = etree.XPath("/html/body/div[2]/div[3]/div[1]/h1")
+DESCRIPTION_XPATH = etree.XPath("/html/body/div[2]/div[3]/div[1]/div[1]/div[3]")
+COVER_XPATH = etree.XPath('//*[@class="slick"]/div/img')
+# the chapter table has an id on the site, the path is for pages without it
+TABLE_XPATH = etree.XPath('//table[@id="Chapters"]/tbody')
+TABLE_PATH_XPATH = etree.XPath("/html/body/div[2]/div[3]/div[1]/form/table/tbody")
+VOLUME_TITLE_XPATH = etree.XPath("td/strong")
+CHAPTER_LINKS_XPATH = etree.XPath("td/a")
+
+TITLE_SPACE_RE = re.compile(r"[\s]{2,}")
+
+
+@dataclass
+class TocVolume:
+    index: int
+    title: str
+
+
+@dataclass
+class TocChapter:
+    # index of the volume in Book.volumes, 0 is the default one
+    volume_index: int
+    chapter_id: str
+    url: str
+    title: str
+
+
+def clean_title(title: str) -> str:
+    """
+    Strip the whitespace that starts every line of a title, joining the lines, and
+    collapse runs of whitespace to a space. Same titles as the old pair of re.sub
+    calls, so journal and manifest entries still match.
+    """
+    title = "".join(line.lstrip() for line in title.split("\n"))
+    return TITLE_SPACE_RE.sub(" ", title)
+
+
+class TocFeed:
+    """
+    Incremental parser of the book index, used as the sink of its download.
+
+    The page is fed in chunks as it arrives. on_header(root) is called once the part
+    of the page above the chapter table is complete. Every row of the table is turned
+    into a TocVolume for on_volume or a TocChapter for on_chapter as soon as its </tr>
+    is read. Rows are dropped once handled, so memory stays flat however long the
+    table is.
+    """
+
+    def __init__(self, on_header, on_volume, on_chapter, base_url: str = ""):
+        self.on_header = on_header
+        self.on_volume = on_volume
+        self.on_chapter = on_chapter
+        self.base_url = base_url
+        # rows and header handled before a retry restarted the download
+        self.emitted = 0
+        self.header_done = False
+        self.reset()
+
+    def reset(self, encoding: str = None):
+        self.parser = etree.HTMLPullParser(
+            events=("end",), tag="tr", encoding=encoding, remove_comments=True
+        )
+        self.root = None
+        self.table = None
+        self.rows = 0
+        self.volumes = 0
+
+    def write(self, chunk: bytes) -> bool:
+        self.parser.feed(chunk)
+        self._read_events()
+        return True
+
+    def close(self):
+        self.root = self.parser.close()
+        self._read_events()
+        if not self.header_done and self.root is not None:
+            self.header_done = True
+            self.on_header(self.root)
+
+    def _find_table(self, row):
+        tree = row.getroottree()
+        table = TABLE_XPATH(tree) or TABLE_PATH_XPATH(tree)
+        if table:
+            self.table = table[0]
+
+    def _read_events(self):
+        for _, row in self.parser.read_events():
+            if self.table is None:
+                self._find_table(row)
+                if self.table is None:
+                    continue
+
+            if row.getparent() is not self.table:
+                continue
+
+            if not self.header_done:
+                # everything above the table has been read
+                self.header_done = True
+                self.on_header(row.getroottree().getroot())
+
+            self.rows += 1
+            self._read_row(row, self.rows > self.emitted)
+            self.emitted = max(self.emitted, self.rows)
+
+            row.clear()
+            while row.getprevious() is not None:
+                del self.table[0]
+
+    def _read_row(self, row, emit: bool):
+        row_id = row.get("id")
+        if not row_id:
+            return
+
+        if row_id.startswith("vol"):
+            # counted on a replay too, the chapters after it need the index
+            self.volumes += 1
+            if emit:
+                title = VOLUME_TITLE_XPATH(row)[0].text
+                self.on_volume(TocVolume(self.volumes, title))
+
+        elif row_id.startswith("c") and emit:
+            links = CHAPTER_LINKS_XPATH(row)
+            if len(links) > 1:
+                self.on_chapter(
+                    TocChapter(
+                        self.volumes,
+                        row_id.split("_")[1],
+                        self.base_url + links[0].get("href"),
+                        clean_title(links[0].text),
+                    )
+                )
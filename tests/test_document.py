@@ -0,0 +1,131 @@
+import pytest
+from lxml import etree
+
+from parser2.document import ContentFeed, parse_html
+
+
+CONTENT_XPATH = '//*[@class="content-text"]'
+CHUNK_SIZES = (1, 2, 3, 7, 100, None)
+
+
+def feed(page: bytes, chunk_size: int = None, encoding: str = None) -> ContentFeed:
+    content_feed = ContentFeed()
+    content_feed.reset(encoding)
+    chunk_size = chunk_size or len(page) or 1
+    for i in range(0, len(page), chunk_size):
+        content_feed.write(page[i : i + chunk_size])
+    return content_feed
+
+
+def page(body: str, head: str = "") -> bytes:
+    return (
+        f"<!DOCTYPE html><html><head>{head}</head><body>"
+        f'<div class="navbar"><div>menu</div></div>{body}'
+        '<div id="comments"><div class="text">comment</div></div></body></html>'
+    ).encode("utf-8")
+
+
+def chapter_page(paragraphs: int, comments: int) -> bytes:
+    """
+    A tl.rulate.ru chapter page: nested layout divs around the content div, a
+    script mentioning it in the head and a comment thread after it.
+    """
+    body = "".join(
+        f'<p style="text-indent: 35.4pt; color: #000000;">Абзац {i}.</p>\n'
+        for i in range(paragraphs)
+    )
+    tail = "".join(
+        f'<div class="comment"><div class="author">user{i}</div>'
+        f'<div class="text"><p>Комментарий {i}.</p></div></div>\n'
+        for i in range(comments)
+    )
+    return page(
+        '<div class="container"><div class="row"><div class="span12">'
+        f'<div class="content-text">\n{body}</div>'
+        f'<div id="comments">{tail}</div></div></div></div>',
+        '<meta charset="utf-8"><title>Глава</title>'
+        '<script>var x = "<div class=content-text>";</script>',
+    )
+
+
+def text(root) -> str:
+    return "".join(root.xpath(CONTENT_XPATH)[0].itertext())
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_matches_full_tree(chunk_size):
+    html = chapter_page(paragraphs=20, comments=20)
+    expected = text(parse_html(html, "utf-8"))
+    assert text(feed(html, chunk_size, "utf-8").close()) == expected
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize(
+    "body",
+    [
+        '<div class="content-text"><p>x</p><div><p>y</p></div></div>',
+        '<div class="content-text"><p>x</p><!-- </div> --><p>y</p></div>',
+        '<div class="content-text"><p>x</p><!-- <div> --><p>y</p></div>',
+        '<div class="content-text"><p>x</p>'
+        '<script>document.write("</div>");</script><p>y</p></div>',
+        '<div class="content-text"><p>x</p>'
+        '<SCRIPT>var s = "<div>";</SCRIPT ><p>y</p></div>',
+        '<div class="content-text"><p>x</p>'
+        "<style>div:after { content: '</div>' }</style><p>y</p></div>",
+        '<div class="content-text"><p>x</p><divider></divider><p>y</p></div>',
+    ],
+)
+def test_content_div(body, chunk_size):
+    assert feed(page(body), chunk_size).content() == body.encode("utf-8")
+    root = feed(page(body), chunk_size).close()
+    assert root.xpath(CONTENT_XPATH + "//p/text()") == ["x", "y"]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize(
+    "head",
+    [
+        '<script>var x = \'<div class="content-text">\';</script>',
+        '<!-- <div class="content-text">old</div> -->',
+    ],
+)
+def test_start_tag_outside_comments_and_scripts(head, chunk_size):
+    body = '<div class="content-text"><p>x</p></div>'
+    assert feed(page(body, head), chunk_size).content() == body.encode("utf-8")
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_missing_div(chunk_size):
+    content_feed = feed(page('<div class="other"><p>x</p></div>'), chunk_size)
+    assert content_feed.content() == b""
+    assert content_feed.close().xpath(CONTENT_XPATH) == []
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_unclosed_div(chunk_size):
+    html = b'<html><body><div class="content-text"><p>x</p><div><p>y'
+    assert feed(html, chunk_size).content() == html[html.index(b"<div") :]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_meta_charset(chunk_size):
+    html = (
+        '<html><head><meta http-equiv="Content-Type" '
+        'content="text/html; charset=windows-1251"></head><body>'
+        '<div class="content-text"><p>Глава</p></div></body></html>'
+    ).encode("cp1251")
+    content_feed = feed(html, chunk_size)
+    assert content_feed.encoding == "windows-1251"
+    assert text(content_feed.close()) == "Глава"
+
+
+def test_encoding_from_headers_wins():
+    html = page('<div class="content-text"><p>x</p></div>', '<meta charset="cp1251">')
+    assert feed(html, 5, "utf-8").encoding == "utf-8"
+
+
+def test_rest_of_page_is_ignored():
+    content_feed = feed(page('<div class="content-text"><p>x</p></div>'))
+    assert content_feed.write(b"</div></div><div>") is True
+    assert content_feed.content() == b'<div class="content-text"><p>x</p></div>'
+    assert isinstance(content_feed.close(), etree._Element)